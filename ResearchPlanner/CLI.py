@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# Headless command line interface for converting plot and field csv-files to the Robotti json-format.
+# Only the plan itself is imported, not Qt or matplotlib, so it runs without a display, e.g. in scheduled pipelines.
+#
+# Example:
+#   python -m ResearchPlanner trial1_plots.csv --pair trial2_plots.csv trial2_field.csv --utm -o out --pto-rpm 540 --set 101 work=false --set 102 ignored=true
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+import Instrumentation
+import Plan as ResearchPlan
+
+
+def _parse_bool(text):
+    if text.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if text.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError('"' + text + '" is not a boolean. Use true or false.')
+
+# Parser of each plot setting (see Plan._PLOT_SETTINGS)
+_SETTING_TYPES = {'work': _parse_bool,
+                  'ignored': _parse_bool,
+                  'force_direction': _parse_bool,
+                  'hitch_height': float,
+                  'working_speed': float,
+                  'pto_rpm': int}
+
+
+def _parse_plot_settings(items):
+    # Parses a list of "setting=value" strings to a dictionary of plot settings
+    settings = {}
+    for item in items:
+        name, separator, value = item.partition('=')
+        if not separator or name not in _SETTING_TYPES:
+            raise ValueError('"' + item + '" is not a plot setting. Use setting=value with one of the settings: ' + ', '.join(_SETTING_TYPES))
+        settings[name] = _SETTING_TYPES[name](value)
+    return settings
+
+
+def _output_filename(filename, output_dir=None):
+    # The output has the name of the input with the extension .json, in output_dir or next to the input
+    name = os.path.splitext(os.path.basename(filename))[0] + '.json'
+    return os.path.join(output_dir if output_dir is not None else os.path.dirname(filename), name)
+
+
+def convert(plots_csv, field_csv, plots_json, field_json, is_utm=False, is_latlon=False, utm_zone=None, settings=None, plot_settings=None, compact=False, simplify_tolerance=None, rectify=False, sort_field=False):
+    # Converts one plot csv-file and/or one field csv-file to json. Runs in the worker processes of main.
+    #   settings        Settings of all plots, e.g. {'work': True, 'pto_rpm': 540}
+    #   plot_settings   Settings of individual plots by ID, e.g. {'101': {'work': False}}. Applied after settings. IDs, which are not in the plots, are skipped.
+    #   simplify_tolerance  If given, the field boundary is written simplified with this tolerance (m). See Field.simplify.
+    #   rectify         If True, the plots are replaced by their best-fit rectangles before they are written. See Plan.rectify_plots.
+    #   sort_field      If True, the field points are sorted along the boundary, e.g. for boundaries exported out of order. See Field._sort_points.
+    # Returns a summary with the number of plots and field points (read and written), the largest distance a corner was moved by rectify, the plot IDs of plot_settings, which were found, and the time used.
+    # If both plots and a field are given, the summary also has the number of plots not completely inside the field and a report of them (see Plan.validate_plots_in_field).
+    # If instrumentation is enabled, the summary has the statistics of the conversion as profile (see Instrumentation.session), otherwise profile is None.
+    # A ValueError or OSError is returned in the summary as error instead of being raised, so the other conversions can continue.
+    start_time = time.perf_counter()
+    summary = {'plots_csv': plots_csv, 'field_csv': field_csv, 'plots_json': plots_json, 'field_json': field_json, 'n_plots': None, 'max_rectify_residual': None, 'n_field_points': None, 'n_field_points_written': None, 'found_ids': [], 'n_plots_outside_field': None, 'field_report': None, 'profile': None, 'error': None}
+    settings = dict(settings or {})
+    plot_settings = plot_settings or {}
+
+    plan = ResearchPlan.Plan()
+    with Instrumentation.session(' + '.join(filename for filename in [plots_csv, field_csv] if filename is not None)) as profile:
+        try:
+            if plots_csv is not None:
+                # Settings supported by read_plot_csv are applied while reading, the remaining afterwards
+                read_settings = {name: settings.pop(name) for name in ['work', 'hitch_height', 'working_speed', 'pto_rpm'] if name in settings}
+                plan.read_plot_csv(plots_csv, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone, **read_settings)
+                if settings:
+                    plan.update_plots([plot.ID for plot in plan.plots], **settings)
+                for plot_id, this_plot_settings in plot_settings.items():
+                    if plan.get_plot(plot_id) is not None:
+                        plan.update_plots([plot_id], **this_plot_settings)
+                        summary['found_ids'].append(plot_id)
+                if rectify:
+                    _, residuals = plan.rectify_plots()
+                    summary['max_rectify_residual'] = float(residuals.max()) if len(residuals) > 0 else 0.0
+                plan.export_plots(plots_json, compact=compact)
+                summary['n_plots'] = len(plan.plots)
+
+            if field_csv is not None:
+                plan.read_field_csv(field_csv, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone, sort_points=sort_field)
+                plan.export_field(field_json, compact=compact, simplify_tolerance=simplify_tolerance)
+                summary['n_field_points'] = len(plan.field.points)
+                summary['n_field_points_written'] = len(plan.field.simplify(simplify_tolerance).points) if simplify_tolerance is not None else len(plan.field.points)
+
+            if (plots_csv is not None) and (field_csv is not None):
+                plot_inside, summary['field_report'] = plan.validate_plots_in_field()
+                summary['n_plots_outside_field'] = int(len(plot_inside) - plot_inside.sum())
+        except (ValueError, OSError) as e:
+            summary['error'] = str(e)
+    summary['profile'] = profile or None
+
+    summary['time'] = time.perf_counter() - start_time
+    return summary
+
+
+def _available_cpus():
+    # CPUs this process may run on, which can be fewer than os.cpu_count() in containers and batch systems
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='python -m ResearchPlanner', description='Convert plot and field csv-files to the Robotti json-format. Each csv-file is written to a json-file with the same name.')
+    parser.add_argument('plots', nargs='*', metavar='PLOTS_CSV', help='plot csv-file without a field')
+    parser.add_argument('-p', '--pair', nargs=2, action='append', default=[], metavar=('PLOTS_CSV', 'FIELD_CSV'), help='plot csv-file and the csv-file of its field. Can be given multiple times.')
+    parser.add_argument('-f', '--field', action='append', default=[], metavar='FIELD_CSV', help='field csv-file without plots. Can be given multiple times.')
+    parser.add_argument('-o', '--output-dir', default=None, help='folder for the json-files (default: next to each csv-file)')
+
+    coordinates = parser.add_mutually_exclusive_group()
+    coordinates.add_argument('--utm', action='store_true', help='coordinates are UTM east and north (default: guess per row)')
+    coordinates.add_argument('--latlon', action='store_true', help='coordinates are latitude and longitude (default: guess per row)')
+    parser.add_argument('--utm-zone', type=int, default=None, help='UTM zone of the plot and field coordinates (default: estimated from the east coordinates)')
+
+    plot_settings = parser.add_argument_group('plot settings', 'Settings of all plots. Plots not given here keep the defaults of Plot.')
+    plot_settings.add_argument('--no-work', dest='work', action='store_false', default=None, help='do not work in the plots')
+    plot_settings.add_argument('--ignored', action='store_true', default=None, help='ignore the plots')
+    plot_settings.add_argument('--force-direction', action='store_true', default=None, help='force the driving direction in the plots')
+    plot_settings.add_argument('--hitch-height', type=float, default=None, help='hitch height in m')
+    plot_settings.add_argument('--working-speed', type=float, default=None, help='working speed in km/h')
+    plot_settings.add_argument('--pto-rpm', type=int, default=None, help='PTO speed in rpm')
+    plot_settings.add_argument('--set', nargs='+', action='append', default=[], metavar=('ID', 'SETTING=VALUE'), dest='plot_settings',
+                               help='settings of a single plot, e.g. --set 101 work=false pto_rpm=540. Applied to the plot with that ID in every plot file. Can be given multiple times.')
+
+    parser.add_argument('--compact', action='store_true', help='write json without indentation')
+    parser.add_argument('--rectify', action='store_true', help='replace the plots by their least-squares best-fit rectangles before writing them, e.g. for GNSS surveyed corners')
+    parser.add_argument('--sort-field', action='store_true', help='sort the field points by their angle around their mean, for boundaries exported out of order. Only for fields, which are star-shaped around that mean (e.g. convex).')
+    parser.add_argument('--simplify-field', type=float, default=None, metavar='TOLERANCE', help='write the field boundary simplified with this tolerance in m, e.g. 0.05 for densely surveyed boundaries (default: all points)')
+    parser.add_argument('--profile', nargs='?', const='1', default=None, metavar='MODES',
+                        help='print the time of each stage and counters of each conversion as a json line. MODES is an optional comma separated list of '
+                             + ', '.join(Instrumentation.CAPTURE_MODES) + ' to also capture the slowest functions and/or the peak memory. Same as setting ' + Instrumentation.ENVIRONMENT_VARIABLE + '.')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: number of available CPUs). With 1, everything runs in this process.')
+    return parser
+
+
+def main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        settings = {name: getattr(args, name) for name in _SETTING_TYPES if getattr(args, name) is not None}
+        plot_settings = {}
+        for plot_id, *items in args.plot_settings:
+            plot_settings.setdefault(plot_id, {}).update(_parse_plot_settings(items))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if (args.profile is not None):
+        # Worker processes read the environment variable, when they import Instrumentation
+        os.environ[Instrumentation.ENVIRONMENT_VARIABLE] = args.profile
+        try:
+            Instrumentation.enable_from_environment()
+        except ValueError as e:
+            parser.error(str(e))
+
+    if (args.simplify_field is not None) and (args.simplify_field < 0):
+        parser.error('The tolerance of --simplify-field must be 0 m or larger.')
+
+    jobs = [(plots_csv, None) for plots_csv in args.plots] + [tuple(pair) for pair in args.pair] + [(None, field_csv) for field_csv in args.field]
+    if not jobs:
+        parser.error('No csv-files given.')
+
+    outputs = {}
+    for plots_csv, field_csv in jobs:
+        for filename in [plots_csv, field_csv]:
+            if filename is not None:
+                outputs.setdefault(os.path.abspath(_output_filename(filename, args.output_dir)), []).append(filename)
+    duplicates = [filenames for filenames in outputs.values() if len(filenames) > 1]
+    if duplicates:
+        parser.error('Several csv-files would be written to the same json-file: ' + '; '.join(', '.join(filenames) for filenames in duplicates))
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    convert_args = [(plots_csv, field_csv,
+                     _output_filename(plots_csv, args.output_dir) if plots_csv is not None else None,
+                     _output_filename(field_csv, args.output_dir) if field_csv is not None else None)
+                    for plots_csv, field_csv in jobs]
+    convert_kwargs = {'is_utm': args.utm, 'is_latlon': args.latlon, 'utm_zone': args.utm_zone, 'settings': settings, 'plot_settings': plot_settings, 'compact': args.compact, 'simplify_tolerance': args.simplify_field, 'rectify': args.rectify, 'sort_field': args.sort_field}
+
+    n_workers = min(args.jobs if args.jobs is not None else _available_cpus(), len(jobs))
+    if (n_workers <= 1):
+        summaries = (convert(*job_args, **convert_kwargs) for job_args in convert_args)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+        summaries = executor.map(convert, *zip(*convert_args), *[[value]*len(convert_args) for value in convert_kwargs.values()])
+
+    n_failed = 0
+    found_ids = set()
+    try:
+        # Summaries are printed in the order of the csv-files given
+        for summary in summaries:
+            found_ids.update(summary['found_ids'])
+            inputs = ' + '.join(filename for filename in [summary['plots_csv'], summary['field_csv']] if filename is not None)
+            if summary['error'] is not None:
+                n_failed += 1
+                print(inputs + ': failed: ' + summary['error'], file=sys.stderr)
+            else:
+                converted = []
+                if summary['n_plots'] is not None:
+                    rectified = ' (rectified, corners moved up to {:.3f} m)'.format(summary['max_rectify_residual']) if summary['max_rectify_residual'] is not None else ''
+                    converted.append(str(summary['n_plots']) + ' plots' + rectified + ' -> ' + summary['plots_json'])
+                if summary['n_field_points'] is not None:
+                    n_written = '' if summary['n_field_points_written'] == summary['n_field_points'] else ' (' + str(summary['n_field_points_written']) + ' written)'
+                    converted.append(str(summary['n_field_points']) + ' field points' + n_written + ' -> ' + summary['field_json'])
+                print(inputs + ': ' + ', '.join(converted) + ' ({:.2f} s)'.format(summary['time']))
+                if summary['n_plots_outside_field']:
+                    print('Warning: ' + inputs + ': ' + summary['field_report'], file=sys.stderr)
+            if summary['profile'] is not None:
+                print(json.dumps(summary['profile']))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    missing_ids = [plot_id for plot_id in plot_settings if plot_id not in found_ids]
+    if missing_ids:
+        print('Warning: no plots with the IDs ' + ', '.join(missing_ids) + ' in any plot file.', file=sys.stderr)
+
+    if n_failed:
+        print(str(n_failed) + ' of ' + str(len(jobs)) + ' conversions failed.', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
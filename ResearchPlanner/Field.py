@@ -1,27 +1,264 @@
-import copy
 import numpy as np
-from Point import Point
+from Point import Point, PointArray
+import Instrumentation
 
 class Field(object):
     points = None
 
-    def __init__(self, points=None):
+    # Derived geometry of the points (see _get_geometry): east and north as float64, bounding box, area, centroid, convex hull and simplified fields by tolerance.
+    # It is computed when first needed and recomputed, when the points have been replaced.
+    _geometry = None
+    _geometry_points = None
+
+    def __init__(self, points=None, sort_points=False):
         if (points is not None):
-            self.set_points(points)
+            self.set_points(points, sort_points=sort_points)
+
+    def set_points(self, points, sort_points=False):
+        #   sort_points     If True, the points are sorted along the boundary (see _sort_points). Otherwise, they are kept in the given order.
+        if (type(points) == list):
+            assert(type(points[0]) == Point)
+            points = PointArray.from_points(points)
+        assert(type(points) == PointArray)
+
+        if sort_points:
+            points = self._sort_points(points)
+        self.points = points
+        # The cache would keep the old points alive, e.g. a memory map of a project file (see Plan._copy_mapped_geometry)
+        self._geometry = None
+        self._geometry_points = None
+
+    @Instrumentation.timed('field.contains')
+    def contains(self, points):
+        # Returns a boolean array, which is True for each point inside the field boundary (even-odd rule, as SpatialIndex.points_in_polygon).
+        #   points      PointArray, or (n,2) array of east and north coordinates
+        # Points outside the bounding box of the field are rejected first. The remaining points are sorted by north, so each edge is only tested
+        # against the points within its north range. All (edge, point) pairs are tested at once, which is about 2 pairs per point for a simple field
+        # instead of one pair per point and edge.
+        if (self.points is None) or (len(self.points) < 3):
+            raise ValueError('The field must have at least 3 points.')
+        if isinstance(points, PointArray):
+            east, north = points.east.astype(np.float64), points.north.astype(np.float64)
+        else:
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            east, north = points[:, 0], points[:, 1]
+
+        geometry = self._get_geometry()
+        x0 = geometry['east']
+        y0 = geometry['north']
+        min_east, min_north, max_east, max_north = geometry['bounding_box']
+        inside = np.zeros(len(east), dtype=bool)
+        candidates = np.flatnonzero((east >= min_east) & (east <= max_east) & (north >= min_north) & (north <= max_north))
+        candidates = candidates[np.argsort(north[candidates], kind='stable')]
+        x = east[candidates]
+        y = north[candidates]
+
+        # An edge is crossed by a ray going east from a point, if the point's north coordinate is in [min(y0, y1), max(y0, y1)) and the edge lies east of it
+        x1 = np.roll(x0, -1)
+        y1 = np.roll(y0, -1)
+        first = np.searchsorted(y, np.minimum(y0, y1), side='left')
+        last = np.searchsorted(y, np.maximum(y0, y1), side='left')
+        n_pairs = last - first
+        edge_idx = np.repeat(np.arange(len(x0)), n_pairs)
+        point_idx = np.repeat(first - (np.cumsum(n_pairs) - n_pairs), n_pairs) + np.arange(n_pairs.sum())
+
+        x0, y0, x1, y1 = x0[edge_idx], y0[edge_idx], x1[edge_idx], y1[edge_idx]
+        x_crossing = x0 + (y[point_idx] - y0)*(x1 - x0)/(y1 - y0)
+        crossings = np.bincount(point_idx[x[point_idx] < x_crossing], minlength=len(candidates))
+        inside[candidates] = (crossings % 2) == 1
+        return inside
+
+    @Instrumentation.timed('field.simplify')
+    def simplify(self, tolerance_m):
+        # Returns a field with the boundary simplified by Douglas-Peucker, which deviates at most tolerance_m (m) from the boundary of this field.
+        # The simplified boundary is a subset of the points in the same order, so their coordinates are unchanged.
+        # The result is cached per tolerance until the points are set again, so drawing and exporting the same simplification costs nothing extra.
+        if (tolerance_m < 0):
+            raise ValueError('The tolerance must be 0 m or larger, not ' + str(tolerance_m) + ' m.')
+        if (self.points is None) or (len(self.points) <= 3):
+            return self
+        geometry = self._get_geometry()
+        simplified = geometry.setdefault('simplified', {})
+
+        field = simplified.get(tolerance_m)
+        if field is None:
+            keep = self._douglas_peucker(geometry['east'], geometry['north'], tolerance_m)
+            # The points are already sorted, so they are not set with set_points
+            field = Field()
+            field.points = self.points[keep]
+            simplified[tolerance_m] = field
+        return field
+
+    @staticmethod
+    def _douglas_peucker(east, north, tolerance):
+        # Returns the indices of the points of the closed polygon (east, north) kept by Douglas-Peucker simplification.
+        # The polygon is split into two chains at point 0 and the point farthest from it. Instead of recursing into one segment at a time,
+        # all segments are split level by level: the distances of the interior points of all segments to their segment are computed at once,
+        # and every segment, whose farthest point is further away than tolerance, is split at that point.
+        # The segments of the first level are always split, so at least 3 points are kept.
+        n_points = len(east)
+        # Point n_points closes the polygon
+        x = np.append(east, east[0])
+        y = np.append(north, north[0])
+        farthest = int(np.argmax(np.hypot(east - east[0], north - north[0])))
+        keep = np.zeros(n_points + 1, dtype=bool)
+        keep[[0, farthest, n_points]] = True
+
+        start = np.array([0, farthest])
+        end = np.array([farthest, n_points])
+        is_first_level = True
+        while True:
+            n_interior = end - start - 1
+            start, end, n_interior = start[n_interior > 0], end[n_interior > 0], n_interior[n_interior > 0]
+            if (len(start) == 0):
+                break
+
+            # Interior points of all segments, segment by segment
+            offsets = np.cumsum(n_interior) - n_interior
+            segment = np.repeat(np.arange(len(start)), n_interior)
+            idx = np.arange(n_interior.sum()) - offsets[segment] + start[segment] + 1
+            distance = Field._segment_distance(x[idx], y[idx], x[start[segment]], y[start[segment]], x[end[segment]], y[end[segment]])
+
+            # The first point with the largest distance in each segment
+            max_distance = np.maximum.reduceat(distance, offsets)
+            is_farthest = np.flatnonzero(distance == max_distance[segment])
+            _, first = np.unique(segment[is_farthest], return_index=True)
+            split_idx = idx[is_farthest[first]]
 
-    def set_points(self, points):
-        assert(type(points) == list)
-        assert(type(points[0]) == Point)
+            split = (max_distance > tolerance) | is_first_level
+            is_first_level = False
+            keep[split_idx[split]] = True
+            start, end = np.concatenate([start[split], split_idx[split]]), np.concatenate([split_idx[split], end[split]])
 
-        points = self._sort_points(points)
-        self.points = copy.deepcopy(points)
+        return np.flatnonzero(keep[:n_points])
 
-    def draw(self, ax):
-        east = [point.east for point in self.points]
-        north = [point.north for point in self.points]
-        ax.fill(east, north, edgecolor=[0,0,0], facecolor=[0.5, 0.5, 0.5], fill=False)
-        ax.scatter(east, north, color=[0,0,0], marker='.', edgecolors='face')
-        pass
+    @staticmethod
+    def _segment_distance(x, y, x0, y0, x1, y1):
+        # Distance from the points (x, y) to the line segments from (x0, y0) to (x1, y1)
+        dx = x1 - x0
+        dy = y1 - y0
+        length_squared = dx*dx + dy*dy
+        t = np.divide((x - x0)*dx + (y - y0)*dy, length_squared, out=np.zeros_like(x), where=length_squared > 0)
+        t = np.clip(t, 0.0, 1.0)
+        return np.hypot(x - (x0 + t*dx), y - (y0 + t*dy))
+
+    def draw(self, ax, simplify_tolerance=None):
+        # Returns the artists of the field. See Rendering.draw_field
+        #   simplify_tolerance  If given, the boundary simplified with this tolerance (m) is drawn. See simplify.
+        import Rendering
+        return Rendering.draw_field(self.simplify(simplify_tolerance) if simplify_tolerance is not None else self, ax)
+
+    def bounding_box(self):
+        # Returns the bounding box of the field as an array: min east, min north, max east, max north
+        return self._get_geometry()['bounding_box'].copy()
+
+    def area(self):
+        # Returns the area (m^2) enclosed by the field boundary (shoelace formula)
+        return self._get_geometry()['area']
+
+    def centroid(self):
+        # Returns the east and north coordinates of the centroid of the area enclosed by the field boundary as an array.
+        # For a boundary without area (e.g. all points on a line), the mean of the points is returned.
+        return self._get_geometry()['centroid'].copy()
+
+    def convex_hull(self):
+        # Returns the points of the field on its convex hull as a PointArray in counter-clockwise order
+        geometry = self._get_geometry()
+        if 'hull' not in geometry:
+            geometry['hull'] = self._convex_hull(geometry['east'], geometry['north'])
+        return self.points[geometry['hull']]
+
+    def _get_geometry(self):
+        # Returns the derived geometry of the points, recomputing it if the points have been replaced since it was computed.
+        # The hull and the simplified fields are added when first needed (see convex_hull and simplify).
+        if (self._geometry is None) or (self._geometry_points is not self.points):
+            if (self.points is None) or (len(self.points) == 0):
+                raise ValueError('The field has no points.')
+            east = self.points.east.astype(np.float64)
+            north = self.points.north.astype(np.float64)
+            # Shoelace formula with the coordinates relative to the first point, which keeps the products small for UTM coordinates
+            x = east - east[0]
+            y = north - north[0]
+            x1 = np.roll(x, -1)
+            y1 = np.roll(y, -1)
+            cross = x*y1 - x1*y
+            signed_area = cross.sum()/2
+            if (abs(signed_area) > 1e-9):
+                centroid = np.array([((x + x1)*cross).sum(), ((y + y1)*cross).sum()])/(6*signed_area) + [east[0], north[0]]
+            else:
+                centroid = np.array([east.mean(), north.mean()])
+            self._geometry = {'east': east, 'north': north,
+                              'bounding_box': np.array([east.min(), north.min(), east.max(), north.max()]),
+                              'area': abs(float(signed_area)),
+                              'centroid': centroid}
+            self._geometry_points = self.points
+        return self._geometry
+
+    @staticmethod
+    def _convex_hull(east, north):
+        # Returns the indices of the points on the convex hull in counter-clockwise order (quickhull).
+        # As in _douglas_peucker, all hull edges are processed level by level: the points right of each edge are found at once,
+        # and every edge with such points is replaced by two edges through its farthest point. Points on an edge are left out.
+        order = np.lexsort((north, east))
+        first, last = order[0], order[-1]
+        if (east[first] == east[last]) and (north[first] == north[last]):
+            return np.array([first])
+        # Relative to the first point, the cross products of UTM coordinates keep their precision
+        east = east - east[first]
+        north = north - north[first]
+
+        # The lower chain from the west-most to the east-most point and the upper chain back
+        start = np.array([first, last])
+        end = np.array([last, first])
+        point_idx = np.concatenate([np.arange(len(east))]*2)
+        edge = np.repeat([0, 1], len(east))
+        hull = [first, last]
+        while (len(point_idx) > 0):
+            # Points right of their edge, i.e. outside the hull found so far
+            x0, y0 = east[start[edge]], north[start[edge]]
+            dx, dy = east[end[edge]] - x0, north[end[edge]] - y0
+            distance = dx*(north[point_idx] - y0) - dy*(east[point_idx] - x0)
+            outside = distance < 0
+            point_idx, edge, distance = point_idx[outside], edge[outside], -distance[outside]
+            if (len(point_idx) == 0):
+                break
+            # Position along the edge. Several points can be farthest from an edge, if they are on a line parallel to it. Only the first and
+            # the last of them are hull points, so the one closest to the start of the edge is taken. Any other would leave collinear points on the hull.
+            along = dx[outside]*(east[point_idx] - x0[outside]) + dy[outside]*(north[point_idx] - y0[outside])
+
+            # The farthest point of each edge with points outside
+            sort_idx = np.argsort(edge, kind='stable')
+            point_idx, edge, distance, along = point_idx[sort_idx], edge[sort_idx], distance[sort_idx], along[sort_idx]
+            edges, offsets, group = np.unique(edge, return_index=True, return_inverse=True)
+            max_distance = np.maximum.reduceat(distance, offsets)
+            is_farthest = np.flatnonzero(distance == max_distance[group])
+            is_farthest = is_farthest[np.lexsort((along[is_farthest], group[is_farthest]))]
+            _, first_farthest = np.unique(group[is_farthest], return_index=True)
+            farthest = point_idx[is_farthest[first_farthest]]
+            hull.extend(farthest.tolist())
+
+            # Each point is tested against both new edges. It can only be outside one of them.
+            start, end = np.concatenate([start[edges], farthest]), np.concatenate([farthest, end[edges]])
+            point_idx = np.concatenate([point_idx, point_idx])
+            edge = np.concatenate([group, group + len(edges)])
+
+        # The hull points are in convex position, so they are ordered by their angle around their mean
+        hull = np.asarray(hull)
+        angle = np.arctan2(north[hull] - north[hull].mean(), east[hull] - east[hull].mean())
+        hull = hull[np.argsort(angle, kind='stable')]
+        return np.roll(hull, -int(np.flatnonzero(hull == first)[0]))
 
     def _sort_points(self, points):
-        return points
\ No newline at end of file
+        # Returns the points sorted by their angle around the mean of the points, starting at the first point given.
+        # This is for boundaries exported out of order (e.g. by GIS software). It only gives the right boundary, if the field is star-shaped around the
+        # mean of its points (e.g. convex), and it changes concave boundaries, which are already in order. Hence, it is only done on request (see set_points).
+        if (len(points) <= 3):
+            return points
+        east = points.east.astype(np.float64)
+        north = points.north.astype(np.float64)
+        east_offset = east - east.mean()
+        north_offset = north - north.mean()
+        order = np.lexsort((np.hypot(east_offset, north_offset), np.arctan2(north_offset, east_offset)))
+        order = np.roll(order, -int(np.flatnonzero(order == 0)[0]))
+        return points[order]
+
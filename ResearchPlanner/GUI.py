@@ -4,11 +4,12 @@ from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as Navigatio
 from matplotlib.figure import Figure
 
 from PyQt5 import QtGui
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5 import QtCore
-from PyQt5.QtWidgets import QMainWindow, QDialog, QApplication, QDialogButtonBox, QVBoxLayout, QFormLayout, QCheckBox, QSpinBox, QDoubleSpinBox, QFileDialog, QLabel, QAction, qApp, QWidget, QMenu
+from PyQt5.QtWidgets import QMainWindow, QDialog, QApplication, QDialogButtonBox, QVBoxLayout, QFormLayout, QCheckBox, QSpinBox, QDoubleSpinBox, QFileDialog, QLabel, QAction, qApp, QWidget, QMenu, QProgressBar, QPushButton
 import sys
 
+import Instrumentation
 import Plan as ResearchPlan
 
 
@@ -50,6 +51,45 @@ class GUI():
             return output
 
 
+    class Worker(QRunnable):
+        # Runs function(*args, progress=..., **kwargs) in a thread pool, so the GUI stays responsive.
+        # The progress, result or exception is sent with Qt signals, which are handled in the thread of the GUI.
+        # Cancelling makes the next call of progress raise a UserWarning, as when a file dialog is cancelled.
+        # If instrumentation is enabled, profile holds the statistics of the function afterwards (see Instrumentation.session).
+
+        class Signals(QObject):
+            progress = pyqtSignal(float)
+            finished = pyqtSignal(object)
+            failed = pyqtSignal(object)
+
+        def __init__(self, caption, function, *args, **kwargs):
+            super().__init__()
+            self.setAutoDelete(False)
+            self.caption = caption
+            self.function = function
+            self.args = args
+            self.kwargs = kwargs
+            self.signals = GUI.Worker.Signals()
+            self.profile = {}
+            self._cancelled = False
+
+        def cancel(self):
+            self._cancelled = True
+
+        def _progress(self, fraction):
+            if self._cancelled:
+                raise UserWarning('"' + self.caption + '" cancelled by user.')
+            self.signals.progress.emit(fraction)
+
+        def run(self):
+            try:
+                with Instrumentation.session(self.caption) as self.profile:
+                    result = self.function(*self.args, progress=self._progress, **self.kwargs)
+            except Exception as e:
+                self.signals.failed.emit(e)
+            else:
+                self.signals.finished.emit(result)
+
     class PlotSettingsDialog(QDialog):
 
         def __init__(self, ID=None, ignore=False, force_direction=False, work=True, working_speed=1.0, hitch_height=0.6, pto_rpm=0.0, working_speed_min=1.0, working_speed_max=6.0, hitch_height_min=0.16, hitch_height_max=0.6, pto_rpm_min=0, pto_rpm_max=4000, *args, **kwargs):
@@ -147,6 +187,25 @@ class GUI():
 class ResearchPlannerGUI(QMainWindow):
 
     plan = None
+    _scene = {}
+    _details = {}
+    _details_key = None
+
+    # Full detail (hatching, IDs, A/B labels and end point markers) is only drawn, when at most this many plots are in view
+    _LOD_MAX_DETAIL_PLOTS = 500
+    # Delay after the last pan or zoom step, before the details are redrawn
+    _LOD_DELAY_MS = 100
+    # The field boundary is drawn simplified with this tolerance (m), which is far below a pixel at any useful zoom. Imports and exports keep all points.
+    _FIELD_DRAW_TOLERANCE = 0.05
+
+    # Background task (see _run_in_background). Only one task runs at a time.
+    _worker = None
+    _worker_on_finished = None
+    _worker_error_message = None
+    # Rows per chunk, when importing csv-files. Progress is reported after each chunk.
+    _IMPORT_CHUNK_SIZE = 8192
+    # Sort the points of imported fields along the boundary, e.g. for boundaries exported out of order (see Field._sort_points)
+    _sort_field_points = False
 
     def __init__(self, app=None, plan=None, *args, **kwargs):
         super().__init__(*args,**kwargs)
@@ -181,6 +240,21 @@ class ResearchPlannerGUI(QMainWindow):
         import_field_action.setStatusTip('Import field')
         import_field_action.triggered.connect(self.import_field)
 
+        sort_field_points_action = QAction('Sort field points on import', self, checkable=True)
+        sort_field_points_action.setStatusTip('Sort the points of imported fields by their angle around the field, for boundaries exported out of order')
+        sort_field_points_action.setChecked(self._sort_field_points)
+        sort_field_points_action.triggered.connect(self.toggle_sort_field_points)
+
+        open_project_action = QAction('&Open Project', self)
+        open_project_action.setShortcut('Ctrl+O')
+        open_project_action.setStatusTip('Open a saved Research Planner project')
+        open_project_action.triggered.connect(self.open_project)
+
+        save_project_action = QAction('&Save Project', self)
+        save_project_action.setShortcut('Ctrl+S')
+        save_project_action.setStatusTip('Save plots, field and plot settings as a Research Planner project')
+        save_project_action.triggered.connect(self.save_project)
+
         export_plots_action = QAction('Export Plots', self)
         export_plots_action.setStatusTip('Export plots to Robotti compatible json-format')
         export_plots_action.triggered.connect(self.export_plots)
@@ -190,8 +264,12 @@ class ResearchPlannerGUI(QMainWindow):
         export_field_action.triggered.connect(self.export_field)
 
         
+        file_menu.addAction(open_project_action)
+        file_menu.addAction(save_project_action)
+        file_menu.addSeparator()
         file_menu.addAction(import_plots_action)
         file_menu.addAction(import_field_action)
+        file_menu.addAction(sort_field_points_action)
         file_menu.addSeparator()
         file_menu.addAction(export_plots_action)
         file_menu.addAction(export_field_action)
@@ -204,7 +282,12 @@ class ResearchPlannerGUI(QMainWindow):
         settings_all_plots_action.setStatusTip('Edit the settings of all plots at once')
         settings_all_plots_action.triggered.connect(self.settings_all_plots)
 
+        rectify_plots_action = QAction('Rectify Plots', self)
+        rectify_plots_action.setStatusTip('Replace all plots by their best-fit rectangles')
+        rectify_plots_action.triggered.connect(self.rectify_plots)
+
         edit_menu.addAction(settings_all_plots_action)
+        edit_menu.addAction(rectify_plots_action)
 
         ## "View" menu
         view_menu = menubar.addMenu('&View')
@@ -235,6 +318,14 @@ class ResearchPlannerGUI(QMainWindow):
         view_menu.addSeparator()
         view_menu.addAction(view_field_action)
 
+        view_profile_action = QAction('Profile', self, checkable=True)
+        view_profile_action.setStatusTip('Toggle showing the time of each stage of imports, exports and redraws in the status bar')
+        view_profile_action.setChecked(Instrumentation.is_enabled())
+        view_profile_action.triggered.connect(self.toggle_profile)
+
+        view_menu.addSeparator()
+        view_menu.addAction(view_profile_action)
+
         self._reset_view()
 
         ### Setup main area
@@ -243,44 +334,69 @@ class ResearchPlannerGUI(QMainWindow):
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
-        self.canvas.mpl_connect('pick_event', self.on_pick_event)
+        self.canvas.mpl_connect('button_press_event', self.on_click_event)
+        self.toolbar = NavigationToolbar(self.canvas, self)
+        # Pan and zoom steps come in rapid succession. The details are only redrawn, once the view has settled.
+        self._lod_timer = QtCore.QTimer(self)
+        self._lod_timer.setSingleShot(True)
+        self._lod_timer.setInterval(self._LOD_DELAY_MS)
+        self._lod_timer.timeout.connect(self._update_details)
         ## Setup layout of window widget
         layout = QVBoxLayout()
+        layout.addWidget(self.toolbar)
         layout.addWidget(self.canvas)
         window_widget.setLayout(layout)
 
         # Set window widget as central widget of main window
         self.setCentralWidget(window_widget)
 
+        ## Setup progress bar and cancel button for background tasks
+        self._thread_pool = QThreadPool()
+        self._progress_bar = QProgressBar()
+        self._progress_bar.setRange(0, 100)
+        self._progress_bar.setMaximumWidth(200)
+        self._progress_bar.hide()
+        self._cancel_button = QPushButton('Cancel')
+        self._cancel_button.setStatusTip('Cancel the running import or export')
+        self._cancel_button.clicked.connect(self.cancel_task)
+        self._cancel_button.hide()
+        self.statusBar().addPermanentWidget(self._progress_bar)
+        self.statusBar().addPermanentWidget(self._cancel_button)
+
         self.statusBar().showMessage('Ready')
         self.show()
 
-    def on_pick_event(self, event):
-        # print(event.artist)
-        plot_id = event.artist.get_text()
+    def on_click_event(self, event):
+        # Opens the settings of the plot under the cursor. The plot is found with the spatial index of the plan.
+        if (event.inaxes is not self.ax) or (event.button != 1) or (self.plan.plots is None) or self.toolbar.mode:
+            return
+        if self._is_busy():
+            return
 
-        plot = None
-        for idx, _plot in enumerate(self.plan.plots):
-            if _plot.ID == plot_id:
-                plot = _plot
-                plot_idx = idx
-                break
+        plot_idx = self.plan.plot_at(event.xdata, event.ydata, return_index=True)
+        plot = self.plan.plots[plot_idx] if plot_idx is not None else None
 
         if plot is not None:
+            plot_id = plot.ID
             plotDlg = GUI.PlotSettingsDialog(ID=plot_id, ignore=plot.ignored, force_direction=plot.force_direction, work=plot.work, working_speed=plot.working_speed, hitch_height=plot.hitch_height, pto_rpm=plot.pto_rpm)
             if (plotDlg.exec_()):
                 settings = plotDlg.get_settings()
 
                 print(settings)
 
-                plot.ignored = settings['ignore']
-                plot.force_direction = settings['force_direction']
-                plot.work = settings['work']
-                plot.working_speed = settings['working_speed']
-                plot.hitch_height = settings['hitch_height']
-                plot.pto_rpm = settings['pto_rpm']
+                plot_indices = self.plan.update_plots([plot_id], **self._plot_settings(settings))
+
+                self._restyle_canvas(plot_indices=plot_indices)
 
-                self._update_canvas()
+    @staticmethod
+    def _plot_settings(settings):
+        # Converts the settings of a PlotSettingsDialog to keyword arguments for Plan.update_plots
+        return {'ignored': settings['ignore'],
+                'force_direction': settings['force_direction'],
+                'work': settings['work'],
+                'working_speed': settings['working_speed'],
+                'hitch_height': settings['hitch_height'],
+                'pto_rpm': settings['pto_rpm']}
 
 
     def _reset_view(self):
@@ -289,56 +405,205 @@ class ResearchPlannerGUI(QMainWindow):
         self._show_end_points = True
         self._show_field = True
 
+    def open_project(self):
+        if self._is_busy():
+            return
+        self.statusBar().showMessage('Opening project...')
+        try:
+            import_dlg = GUI.ImportFileDialog()
+            filename_project = import_dlg.get_file(caption='Open project', filter='Research Planner project (*.rpp);;All files (*.*)')
+            self.plan.read_project(filename_project)
+
+            self._update_canvas()
+
+            self.statusBar().showMessage('Project opened: ' + filename_project)
+        except UserWarning as e:
+            self.statusBar().showMessage(str(e))
+        except (ValueError, OSError) as e:
+            self.statusBar().showMessage('Project could not be opened: ' + str(e))
+
+    def save_project(self):
+        if self._is_busy():
+            return
+        self.statusBar().showMessage('Saving project...')
+
+        try:
+            export_dlg = GUI.ExportFileDialog()
+            filename_project = export_dlg.get_file(caption='Save project', filter='Research Planner project (*.rpp);;All files (*.*)')
+            self.plan.save_project(filename_project)
+            self.statusBar().showMessage('Project saved: ' + filename_project)
+        except UserWarning as e:
+            self.statusBar().showMessage(str(e))
+        except (ValueError, OSError) as e:
+            self.statusBar().showMessage('Project could not be saved: ' + str(e))
+
     def import_plots(self):
+        if self._is_busy():
+            return
         self.statusBar().showMessage('Importing plots...')
         try:
             import_dlg = GUI.ImportFileDialog()
             filename_plots = import_dlg.get_file(caption='Import plots', filter='CSV (*.csv);;All files (*.*)')
-            self.plan.read_plot_csv(filename_plots, is_utm=True)
-                    
-            self._update_canvas()
-
-            self.statusBar().showMessage('Plots imported: ' + filename_plots)
+            # The plots are read into a new plan, so the current plan is unchanged until the whole file has been read
+            self._run_in_background('Import plots', self._read_plot_csv, filename_plots,
+                                    on_finished=lambda plan: self._apply_imported_plots(plan, filename_plots),
+                                    error_message='Plots could not be imported: ')
         except UserWarning as e:
             self.statusBar().showMessage(str(e))
 
+    @staticmethod
+    def _read_plot_csv(filename, progress=None):
+        plan = ResearchPlan.Plan()
+        plan.read_plot_csv(filename, is_utm=True, chunk_size=ResearchPlannerGUI._IMPORT_CHUNK_SIZE, progress=progress)
+        return plan
+
+    def _apply_imported_plots(self, plan, filename_plots):
+        self.plan.set_plots(plan.plots)
+
+        self._update_canvas()
+
+        self.statusBar().showMessage('Plots imported: ' + filename_plots + self._field_validation_message())
 
     def import_field(self):
+        if self._is_busy():
+            return
         self.statusBar().showMessage('Importing field...')
         try:
             import_dlg = GUI.ImportFileDialog()
             filename_field = import_dlg.get_file(caption='Import field', filter='CSV (*.csv);;All files (*.*)')
-            self.plan.read_field_csv(filename_field, is_utm=True)
-            
-            self._update_canvas()
-
-            self.statusBar().showMessage('Field imported: ' + filename_field)
+            self._run_in_background('Import field', self._read_field_csv, filename_field, sort_points=self._sort_field_points,
+                                    on_finished=lambda plan: self._apply_imported_field(plan, filename_field),
+                                    error_message='Field could not be imported: ')
         except UserWarning as e:
             self.statusBar().showMessage(str(e))
 
+    @staticmethod
+    def _read_field_csv(filename, progress=None, sort_points=False):
+        plan = ResearchPlan.Plan()
+        plan.read_field_csv(filename, is_utm=True, chunk_size=ResearchPlannerGUI._IMPORT_CHUNK_SIZE, progress=progress, sort_points=sort_points)
+        return plan
+
+    def _apply_imported_field(self, plan, filename_field):
+        self.plan.field = plan.field
+
+        self._update_canvas()
+
+        # A field with less than 3 points has no area
+        size = '{:d} points, {:.2f} ha'.format(len(plan.field.points), plan.field.area()/1e4) if len(plan.field.points) >= 3 else '{:d} points'.format(len(plan.field.points))
+        self.statusBar().showMessage('Field imported: ' + filename_field + ' (' + size + ')' + self._field_validation_message())
+
+    def _field_validation_message(self):
+        # Report of the plots outside the field to append to the status message, or an empty string, if all plots are inside or there is nothing to check
+        if (not self.plan.plots) or (self.plan.field is None) or (self.plan.field.points is None) or (len(self.plan.field.points) < 3):
+            return ''
+        plot_inside, report = self.plan.validate_plots_in_field()
+        return '' if plot_inside.all() else '. Warning: ' + report
+
     def export_plots(self):
+        if self._is_busy():
+            return
         self.statusBar().showMessage('Exporting plots...')
         
         try:
             export_dlg = GUI.ExportFileDialog()
             filename_out_plots = export_dlg.get_file(caption='Export plots')
-            self.plan.export_plots(filename_out_plots)
-            self.statusBar().showMessage('Plots exported: ' + filename_out_plots)
+            # The exported file is only replaced once it has been written completely, so a cancelled export leaves no partial file
+            self._run_in_background('Export plots', self.plan.export_plots, filename_out_plots,
+                                    on_finished=lambda _: self.statusBar().showMessage('Plots exported: ' + filename_out_plots),
+                                    error_message='Plots could not be exported: ')
         except UserWarning as e:
             self.statusBar().showMessage(str(e))
 
     def export_field(self):
+        if self._is_busy():
+            return
         self.statusBar().showMessage('Exporting field...')
         
         try:
             export_dlg = GUI.ExportFileDialog()
             filename_out_field = export_dlg.get_file(caption='Export field')
-            self.plan.export_field(filename_out_field)
-            self.statusBar().showMessage('Field exported: ' + filename_out_field)
+            self._run_in_background('Export field', self.plan.export_field, filename_out_field,
+                                    on_finished=lambda _: self.statusBar().showMessage('Field exported: ' + filename_out_field),
+                                    error_message='Field could not be exported: ')
         except UserWarning as e:
             self.statusBar().showMessage(str(e))
 
+    def _is_busy(self):
+        # Shows a message and returns True, if a background task is running.
+        # Every action, which reads or changes the plan (imports, exports, projects, settings and rectifying), must check this first,
+        # since the task reads or writes the plan, and its result is applied to the plan, when it finishes.
+        if self._worker is not None:
+            self.statusBar().showMessage('"' + self._worker.caption + '" is still running. Wait for it to finish or cancel it.')
+        return self._worker is not None
+
+    def _run_in_background(self, caption, function, *args, on_finished=None, error_message='', **kwargs):
+        # Runs function(*args, progress=..., **kwargs) in a worker thread with a progress bar and a cancel button in the status bar.
+        # on_finished is called with the result in the thread of the GUI. Exceptions are shown in the status bar prefixed with error_message.
+        worker = GUI.Worker(caption, function, *args, **kwargs)
+        worker.signals.progress.connect(self._on_task_progress)
+        worker.signals.finished.connect(self._on_task_finished)
+        worker.signals.failed.connect(self._on_task_failed)
+        self._worker = worker
+        self._worker_on_finished = on_finished
+        self._worker_error_message = error_message
+
+        self._progress_bar.setValue(0)
+        self._progress_bar.show()
+        self._cancel_button.show()
+        self._thread_pool.start(worker)
+
+    def cancel_task(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self.statusBar().showMessage('Cancelling "' + self._worker.caption + '"...')
+
+    def _on_task_progress(self, fraction):
+        self._progress_bar.setValue(int(round(100*fraction)))
+
+    def _on_task_finished(self, result):
+        on_finished = self._worker_on_finished
+        error_message = self._worker_error_message
+        profile = self._worker.profile
+        self._end_task()
+        # An exception must not leave this slot, since PyQt aborts the application on it. Errors are shown as for a failed task.
+        try:
+            with Instrumentation.session('redraw') as redraw_profile:
+                if on_finished is not None:
+                    on_finished(result)
+        except Exception as e:
+            self._show_task_error(error_message, e)
+            return
+        if profile:
+            # The statistics of the task and of applying its result are appended to the message of on_finished
+            self.statusBar().showMessage(' | '.join(text for text in [self.statusBar().currentMessage(), Instrumentation.summary_text(profile), Instrumentation.summary_text(redraw_profile)] if text))
+
+    def _on_task_failed(self, exception):
+        error_message = self._worker_error_message
+        self._end_task()
+        self._show_task_error(error_message, exception)
+
+    def _show_task_error(self, error_message, exception):
+        if isinstance(exception, UserWarning):
+            self.statusBar().showMessage(str(exception))
+        else:
+            self.statusBar().showMessage(error_message + str(exception))
+
+    def _end_task(self):
+        self._worker = None
+        self._worker_on_finished = None
+        self._worker_error_message = None
+        self._progress_bar.hide()
+        self._cancel_button.hide()
+
+    def closeEvent(self, event):
+        # Stop a running background task, before the window is closed
+        self.cancel_task()
+        self._thread_pool.waitForDone()
+        super().closeEvent(event)
+
     def settings_all_plots(self):
+        if self._is_busy():
+            return
         if (self.plan.plots is not None):
             plot = self.plan.plots[0]
 
@@ -350,56 +615,152 @@ class ResearchPlannerGUI(QMainWindow):
                 print(settings)
 
                 # Update all plots with settings
-                for plot in self.plan.plots:
-                    plot.ignored = settings['ignore']
-                    plot.force_direction = settings['force_direction']
-                    plot.work = settings['work']
-                    plot.working_speed = settings['working_speed']
-                    plot.hitch_height = settings['hitch_height']
-                    plot.pto_rpm = settings['pto_rpm']
+                self.plan.update_plots([plot.ID for plot in self.plan.plots], **self._plot_settings(settings))
 
-                self._update_canvas()
+                self._restyle_canvas()
+
+    def rectify_plots(self):
+        if self._is_busy():
+            return
+        if (self.plan.plots is not None):
+            plot_indices, residuals = self.plan.rectify_plots()
+
+            self._update_canvas()
+
+            self.statusBar().showMessage('Rectified ' + str(len(plot_indices)) + ' plots. Corners moved up to {:.3f} m'.format(residuals.max() if len(residuals) > 0 else 0.0) + self._field_validation_message())
 
     def toggle_view_plot(self, state):
         if state:
             self._show_plots = True
         else:
             self._show_plots = False
-        self._update_canvas()
+        self._update_visibility()
 
     def toggle_view_field(self, state):
         if state:
             self._show_field = True
         else:
             self._show_field = False
-        self._update_canvas()
+        self._update_visibility()
+
+    def toggle_profile(self, state):
+        # Instrumentation started with RESEARCH_PLANNER_PROFILE keeps its capture modes, when it is toggled off and on again
+        if state:
+            Instrumentation.enable_from_environment()
+            if not Instrumentation.is_enabled():
+                Instrumentation.enable()
+        else:
+            Instrumentation.disable()
+
+    def toggle_sort_field_points(self, state):
+        # Applies to the next field import. The current field is kept as it is.
+        self._sort_field_points = bool(state)
 
     def toggle_view_ab_line(self, state):
         if state:
             self._show_ab_lines = True
         else:
             self._show_ab_lines = False
-        self._update_canvas()
+        self._update_visibility()
 
     def toggle_view_end_points(self, state):
         if state:
             self._show_end_points = True
         else:
             self._show_end_points = False
-        self._update_canvas()
+        self._update_visibility()
 
     def _update_canvas(self):
+        # Rebuilds the scene with one group of artists per layer. Only needed, when the plots or the field of the plan are replaced.
+        # Settings and visibility changes update the existing artists instead (see _restyle_canvas and _update_visibility).
+        # The scene only holds the plain layers of all plots. Hatching, labels and end point markers are added for the plots in view by _update_details.
 
         self.statusBar().showMessage('Updating canvas...')
         self.ax.clear()
 
-        self.plan.draw(ax=self.ax, show_field=self._show_field, show_plot=self._show_plots, show_AB_line=self._show_ab_lines, show_AB=self._show_ab_lines, show_end_points=self._show_end_points)
+        self._scene = {}
+        self._details = {}
+        self._details_key = None
+        if (self.plan.field is not None):
+            self._scene['field'] = self.plan.field.draw(ax=self.ax, simplify_tolerance=self._FIELD_DRAW_TOLERANCE)
+        if (self.plan.plots is not None):
+            # Hidden layers are only created once they are shown (see _update_visibility)
+            self._scene.update(self.plan.draw_plots(ax=self.ax, show_ID=False, show_plot=self._show_plots, show_AB_line=self._show_ab_lines, show_AB=False, show_end_points=self._show_end_points, hatch=False, end_point_markers=False))
 
-        ResearchPlan.plt.show()
+        self.ax.axis('equal')
+        self.ax.set_xlabel('East, m')
+        self.ax.set_ylabel('North, m')
 
-        self.canvas.draw()
+        # Clearing the axes also removes its callbacks
+        self.ax.callbacks.connect('xlim_changed', self._on_view_changed)
+        self.ax.callbacks.connect('ylim_changed', self._on_view_changed)
+
+        self._update_visibility()
         self.statusBar().showMessage('Canvas updated')
 
+    def _restyle_canvas(self, plot_indices=None):
+        # Updates the appearance of the given plots (default: all) after their settings have changed
+        for artists in [self._scene, self._details]:
+            if 'plot_index' in artists:
+                self.plan.restyle_plots(artists, plot_indices=plot_indices)
+        self.canvas.draw_idle()
+
+    def _update_visibility(self):
+        # Shows or hides each layer of the scene according to the View menu
+        layers = {'field': self._show_field,
+                  'plots': self._show_plots,
+                  'hatch': self._show_plots,
+                  'ab_lines': self._show_ab_lines,
+                  'AB': self._show_ab_lines,
+                  'end_points': self._show_end_points,
+                  'end_point_markers': self._show_end_points}
+        missing_layers = {'show_plot': self._show_plots and 'plots' not in self._scene,
+                          'show_AB_line': self._show_ab_lines and 'ab_lines' not in self._scene,
+                          'show_end_points': self._show_end_points and 'end_points' not in self._scene}
+        if (self.plan.plots is not None) and any(missing_layers.values()):
+            new_artists = self.plan.draw_plots(ax=self.ax, show_ID=False, show_AB=False, hatch=False, end_point_markers=False, **missing_layers)
+            new_artists.pop('plot_index')
+            self._scene.update(new_artists)
+
+        # The details of a layer are only drawn while the layer is shown
+        self._update_details(draw=False)
+
+        for artists in [self._scene, self._details]:
+            for layer, visible in layers.items():
+                layer_artists = artists.get(layer, [])
+                for artist in (layer_artists if isinstance(layer_artists, list) else [layer_artists]):
+                    artist.set_visible(visible)
+        self.canvas.draw_idle()
+
+    def _on_view_changed(self, ax):
+        # Called for every change of the axis limits, e.g. while panning or zooming. Restarts the delay before the details are updated.
+        self._lod_timer.start()
+
+    def _update_details(self, draw=True):
+        # Level of detail: draws hatching, IDs, A/B labels and end point markers only for the plots in view, and only when few enough plots are in view.
+        # Zoomed out, the plots are drawn as plain outlines by the scene. The details are only redrawn, if the plots in view or the shown layers change.
+        plot_indices = ()
+        if (self.plan.plots is not None):
+            (min_east, max_east), (min_north, max_north) = sorted(self.ax.get_xlim()), sorted(self.ax.get_ylim())
+            plot_indices = self.plan.plots_in_bbox(min_east, min_north, max_east, max_north, return_index=True)
+            if (len(plot_indices) > self._LOD_MAX_DETAIL_PLOTS):
+                plot_indices = ()
+        details_key = (tuple(plot_indices), self._show_plots, self._show_ab_lines, self._show_end_points)
+        if (details_key == self._details_key):
+            return
+        self._details_key = details_key
+
+        for layer, artists in self._details.items():
+            if (layer != 'plot_index'):
+                for artist in (artists if isinstance(artists, list) else [artists]):
+                    artist.remove()
+        self._details = {}
+        if plot_indices:
+            self._details = self.plan.draw_plot_details(ax=self.ax, plot_indices=plot_indices, show_hatch=self._show_plots, show_AB=self._show_ab_lines, show_end_point_markers=self._show_end_points)
+
+        if draw:
+            self.canvas.draw_idle()
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
 
@@ -0,0 +1,214 @@
+# Low-overhead instrumentation of the import, export and drawing pipeline with named timing spans and counters.
+#
+#   with Instrumentation.span('csv.parse'):         # adds a call and the wall time of the block to the span csv.parse
+#       ...
+#   Instrumentation.count('plots.built', n)         # adds n to the counter plots.built
+#
+#   @Instrumentation.timed('plot.geometry')          # times every call of a function as a span
+#   def _batch_geometry(corners): ...
+#
+# Instrumentation is off by default. Then span returns a shared do-nothing context manager and count returns at once, so the stages can stay instrumented.
+# It is switched on with enable() or the environment variable RESEARCH_PLANNER_PROFILE, e.g.
+#   RESEARCH_PLANNER_PROFILE=1                          spans and counters
+#   RESEARCH_PLANNER_PROFILE=cprofile,tracemalloc       spans and counters, and the functions using the most time (cProfile) and/or the peak memory (tracemalloc)
+# The environment variable is also read by worker processes, e.g. those of the command line interface.
+# When this module is imported, an invalid value only gives a warning and leaves instrumentation disabled, so a typo cannot stop the application.
+#
+# Spans of nested stages are included in the time of the outer span, e.g. point.to_latlon is part of read_plot_csv.
+# The statistics of all threads are collected together. A session (see session) reports the statistics recorded while it was running,
+# and the cProfile and tracemalloc captures, which only cover the session (cProfile only of the thread running it).
+import contextlib
+import functools
+import os
+import threading
+import time
+import warnings
+
+ENVIRONMENT_VARIABLE = 'RESEARCH_PLANNER_PROFILE'
+CAPTURE_MODES = ('cprofile', 'tracemalloc')
+
+_enabled = False
+_capture_modes = frozenset()
+_lock = threading.Lock()
+_spans = {} # name -> [calls, time (s)]
+_counters = {} # name -> count
+
+
+class _Span(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stats = _spans.get(self.name)
+            if stats is None:
+                _spans[self.name] = [1, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+        return False
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name):
+    # Context manager timing a stage. Does nothing, if instrumentation is disabled.
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    # Decorator timing every call of the function as the span name
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    # Adds n to a counter. Does nothing, if instrumentation is disabled.
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def enable(cprofile=False, tracemalloc=False):
+    # Switches on the spans and counters and, optionally, the cProfile and tracemalloc captures of sessions
+    global _enabled, _capture_modes
+    _capture_modes = frozenset(mode for mode, on in zip(CAPTURE_MODES, [cprofile, tracemalloc]) if on)
+    _enabled = True
+
+
+def disable():
+    global _enabled, _capture_modes
+    _enabled = False
+    _capture_modes = frozenset()
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_from_environment():
+    # Enables instrumentation according to RESEARCH_PLANNER_PROFILE (see above). Empty, 0, off and false leave it unchanged.
+    value = os.environ.get(ENVIRONMENT_VARIABLE, '').strip().lower()
+    if value in ('', '0', 'off', 'false', 'no'):
+        return
+    modes = set(mode.strip() for mode in value.split(','))
+    unknown_modes = modes - set(CAPTURE_MODES) - {'1', 'on', 'true', 'yes'}
+    if unknown_modes:
+        raise ValueError('Unknown modes in ' + ENVIRONMENT_VARIABLE + ': ' + ', '.join(sorted(unknown_modes)) + '. Use 1 or a comma separated list of: ' + ', '.join(CAPTURE_MODES))
+    enable(cprofile='cprofile' in modes, tracemalloc='tracemalloc' in modes)
+
+
+def reset():
+    # Clears all spans and counters
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def statistics():
+    # Returns the spans as {name: {'calls': calls, 'time': time (s)}} and the counters as {name: count} recorded since the last reset
+    with _lock:
+        return {'spans': {name: {'calls': calls, 'time': elapsed} for name, (calls, elapsed) in _spans.items()},
+                'counters': dict(_counters)}
+
+
+@contextlib.contextmanager
+def session(name, n_functions=15):
+    # Context manager yielding a dictionary, which is filled with a summary of the statistics recorded inside the session, when it ends:
+    #   name, time (s), spans and counters (see statistics), and with the capture modes
+    #   functions       The n_functions functions with the largest cumulative time (cProfile)
+    #   peak_memory     Peak memory (bytes) traced during the session (tracemalloc)
+    # The dictionary stays empty, if instrumentation is disabled. Sessions must not be nested in the same thread.
+    summary = {}
+    if not _enabled:
+        yield summary
+        return
+
+    capture_modes = _capture_modes
+    profiler = None
+    if 'cprofile' in capture_modes:
+        import cProfile
+        profiler = cProfile.Profile()
+    stop_tracemalloc = False
+    if 'tracemalloc' in capture_modes:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            stop_tracemalloc = True
+        tracemalloc.reset_peak()
+
+    before = statistics()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield summary
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        summary['name'] = name
+        summary['time'] = time.perf_counter() - start
+        summary.update(_difference(statistics(), before))
+        if profiler is not None:
+            summary['functions'] = _top_functions(profiler, n_functions)
+        if 'tracemalloc' in capture_modes:
+            summary['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            if stop_tracemalloc:
+                tracemalloc.stop()
+
+
+def _difference(after, before):
+    # Statistics recorded between two calls of statistics()
+    spans = {}
+    for name, stats in after['spans'].items():
+        old = before['spans'].get(name, {'calls': 0, 'time': 0.0})
+        if (stats['calls'] > old['calls']):
+            spans[name] = {'calls': stats['calls'] - old['calls'], 'time': stats['time'] - old['time']}
+    counters = {name: n - before['counters'].get(name, 0) for name, n in after['counters'].items() if n != before['counters'].get(name, 0)}
+    return {'spans': spans, 'counters': counters}
+
+
+def _top_functions(profiler, n_functions):
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    # Each entry is (file, line, function): (primitive calls, calls, own time, cumulative time, callers).
+    # The wrappers of timed would hide the functions they wrap, so the functions of this module are left out.
+    own_file = span.__code__.co_filename
+    top = sorted((item for item in stats.items() if item[0][0] != own_file), key=lambda item: item[1][3], reverse=True)[:n_functions]
+    return [{'function': pstats.func_std_string(function), 'calls': calls, 'time': own_time, 'cumulative': cumulative_time}
+            for function, (primitive_calls, calls, own_time, cumulative_time, callers) in top]
+
+
+def summary_text(summary, n_spans=4):
+    # One line describing a session summary, e.g. for a status bar: the total time, the n_spans spans with the largest time, the counters and the peak memory
+    if not summary:
+        return ''
+    spans = sorted(summary['spans'].items(), key=lambda item: item[1]['time'], reverse=True)[:n_spans]
+    parts = [name + ' {:.2f} s'.format(stats['time']) for name, stats in spans]
+    parts += [str(n) + ' ' + name for name, n in sorted(summary['counters'].items())]
+    if 'peak_memory' in summary:
+        parts.append('peak memory {:.1f} MB'.format(summary['peak_memory']/1e6))
+    return summary['name'] + ' {:.2f} s'.format(summary['time']) + (': ' + ', '.join(parts) if parts else '')
+
+
+try:
+    enable_from_environment()
+except ValueError as e:
+    warnings.warn(str(e) + '. Instrumentation stays disabled.')
@@ -1,16 +1,41 @@
 import csv
+import io
+import itertools
 import json
-import matplotlib.pyplot as plt
-from Point import Point
+import os
+import struct
+import numpy as np
+from Point import Point, PointArray
 from Plot import Plot
 from Field import Field
+from SpatialIndex import SpatialIndex
+import Instrumentation
 #from openpyxl import load_workbook # For readin xls(x)-files
 
+# matplotlib is only imported by the draw methods (through Rendering), so reading and exporting plans works without it (e.g. in the command line interface)
+
 class Plan(object):
 
     plots = None
     field = None
 
+    _id_index = None
+    _id_index_plots = None
+    _id_index_size = None
+
+    _spatial_index = None
+    _spatial_index_plots = None
+    _spatial_index_size = None
+    _spatial_index_map = None
+
+    _PROJECT_MAGIC = b'RPLANNER'
+    _PROJECT_VERSION = 1
+    _PROJECT_ALIGNMENT = 64
+    _PROGRESS_INTERVAL = 4096
+    _PLOT_SETTINGS = ('work', 'ignored', 'force_direction', 'hitch_height', 'working_speed', 'pto_rpm')
+    # Maximum number of plots listed by name in the report of validate_plots_in_field
+    _REPORT_MAX_PLOTS = 20
+
     def __init__(self):
         pass
 
@@ -22,35 +47,260 @@ class Plan(object):
         # return self.plan
         pass
 
-    def read_plot_csv(self, filename, is_utm=False, is_latlon=False, utm_zone=None, work=True, hitch_height=0.6, working_speed=1.0, pto_rpm=0):
+    @Instrumentation.timed('read_plot_csv')
+    def read_plot_csv(self, filename, is_utm=False, is_latlon=False, utm_zone=None, work=True, hitch_height=0.6, working_speed=1.0, pto_rpm=0, chunk_size=65536, progress=None, workers=None):
         # Assumes, that csv-file has no header and 4 columns: latitude, longitude, altitude, and id.
         # If is_utm or is_latlon is set to True, it will try to reinforce that interpretation. Otherwise, it will try to guess it based on the size of the numbers.
-
-        plot_id = []
-
-        P = []
-        with open(filename, newline='') as csvfile:
-            csvreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            for row in csvreader:
-                if (is_utm):
-                    P.append(Point(north=float(row[0]), east=float(row[1]), altitude=float(row[2])))
-                elif (is_latlon):
-                    P.append(Point(latitude=float(row[0]), longitude=float(row[1]), altitude=float(row[2])))
+        # The file is read in chunks of chunk_size rows. See iter_plots_csv.
+        #   progress    Optional function, which is called with the fraction (0 to 1) of the file read so far after each chunk.
+        #   workers     Number of processes for parsing the file, converting the coordinates and computing the plot geometry. See _read_plots_parallel.
+        #               None or 1 (default) does everything in this process, which is faster for all but very large layouts.
+
+        if (workers is not None) and (workers > 1):
+            plots = self._read_plots_parallel(filename, workers, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone, chunk_size=chunk_size, progress=progress, work=work, hitch_height=hitch_height, working_speed=working_speed, pto_rpm=pto_rpm)
+        else:
+            plots = list(self.iter_plots_csv(filename, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone, work=work, hitch_height=hitch_height, working_speed=working_speed, pto_rpm=pto_rpm, chunk_size=chunk_size, progress=progress))
+
+        self.set_plots(plots)
+
+    def _read_plots_parallel(self, filename, workers, is_utm=False, is_latlon=False, utm_zone=None, chunk_size=65536, progress=None, **kwargs):
+        # Reads the plots of a csv-file like iter_plots_csv in worker processes. The file is split into byte ranges at line boundaries (see _split_csv).
+        # Each worker parses its range, converts the coordinates and computes the geometry (Plot._batch_geometry) of the plots, which have all 4 corners
+        # in the range, and writes it to shared memory. The buffers are allocated here from the number of lines of each range, so no coordinates are pickled.
+        # Only the rows of plots with corners in more than one range are sent back and completed here.
+        # The plots are ordered by their first row, which is the order of iter_plots_csv, when the corners of each plot are consecutive.
+        # Creating the Plot objects stays in this process.
+        #   kwargs      Settings applied to all plots. See Plot.batch_from_corners.
+        import concurrent.futures
+        from multiprocessing import shared_memory
+
+        dtype = Point.get_precision()
+        # A few ranges per worker evens out the load, if some ranges need more zones or conversions than others
+        ranges = self._split_csv(filename, 4*workers)
+        # A plot has 4 rows, so a range of n lines has at most n//4 complete plots
+        plot_offset = np.cumsum([0] + [n_lines//4 for start, stop, n_lines in ranges])
+        n_slots = int(plot_offset[-1])
+
+        # Shape and dtype of each shared buffer
+        layout = {'corners': ((5, 4*n_slots), dtype),
+                  'corners_zone': ((4*n_slots,), np.dtype(int)),
+                  'ab_lines': ((5, 2*n_slots), dtype),
+                  'ab_lines_zone': ((2*n_slots,), np.dtype(int)),
+                  'flags': ((2, n_slots), np.dtype(bool)),
+                  'first_row': ((n_slots,), np.dtype(int))}
+        buffers = {}
+        arrays = {}
+        try:
+            for name, (shape, this_dtype) in layout.items():
+                # Shared memory cannot be empty
+                buffers[name] = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape))*this_dtype.itemsize, 1))
+                arrays[name] = np.ndarray(shape, dtype=this_dtype, buffer=buffers[name].buf)
+
+            shared = {name: (buffers[name].name, shape, this_dtype.str) for name, (shape, this_dtype) in layout.items()}
+            results = [None]*len(ranges)
+            file_size = max(ranges[-1][1], 1)
+            bytes_read = 0
+            with Instrumentation.span('plot.range_workers'), concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(Plan._plot_range_worker, filename, start, stop, int(plot_offset[i]), shared, is_utm, is_latlon, utm_zone, chunk_size, dtype.str): i
+                           for i, (start, stop, n_lines) in enumerate(ranges)}
+                for future in concurrent.futures.as_completed(futures):
+                    i = futures[future]
+                    results[i] = future.result()
+                    bytes_read += ranges[i][1] - ranges[i][0]
+                    if progress is not None:
+                        progress(bytes_read/file_size)
+
+            # Copy the plots of each range out of the shared memory, which is released below
+            corners = PointArray.concatenate([PointArray()] + [PointArray.from_columns(arrays['corners'][:, 4*offset:4*(offset+len(ids))], arrays['corners_zone'][4*offset:4*(offset+len(ids))], sources[0])
+                                                               for offset, (n_rows, ids, remaining, sources) in zip(plot_offset, results)])
+            ab_lines = PointArray.concatenate([PointArray()] + [PointArray.from_columns(arrays['ab_lines'][:, 2*offset:2*(offset+len(ids))], arrays['ab_lines_zone'][2*offset:2*(offset+len(ids))], sources[1])
+                                                                for offset, (n_rows, ids, remaining, sources) in zip(plot_offset, results)])
+            flags = np.concatenate([np.empty((2, 0), dtype=bool)] + [arrays['flags'][:, offset:offset+len(ids)] for offset, (n_rows, ids, remaining, sources) in zip(plot_offset, results)], axis=1)
+            # Row numbers within the ranges become row numbers within the file
+            row_offset = np.cumsum([0] + [n_rows for n_rows, ids, remaining, sources in results])
+            first_row = np.concatenate([np.empty(0, dtype=int)] + [arrays['first_row'][offset:offset+len(ids)] + row_offset[i] for i, (offset, (n_rows, ids, remaining, sources)) in enumerate(zip(plot_offset, results))])
+        finally:
+            # The arrays must be released before the buffers can be closed
+            arrays.clear()
+            for buffer in buffers.values():
+                buffer.close()
+                buffer.unlink()
+
+        ids = list(itertools.chain.from_iterable(ids for n_rows, ids, remaining, sources in results))
+        remaining_columns = [np.concatenate([np.empty(0, dtype=dtype)] + [remaining[k] for n_rows, ids_, remaining, sources in results]) for k in range(3)]
+        remaining_ids = list(itertools.chain.from_iterable(remaining[3] for n_rows, ids_, remaining, sources in results))
+        remaining_rows = np.concatenate([np.empty(0, dtype=int)] + [remaining[4] + row_offset[i] for i, (n_rows, ids_, remaining, sources) in enumerate(results)])
+
+        # A plot is complete in at most one range, and then it has no rows in any other range
+        complete_count = {}
+        for this_id in ids:
+            complete_count[this_id] = complete_count.get(this_id, 0) + 1
+        groups = self._group_rows_by_id(remaining_ids)
+        bad_ids = {this_id: 4*n for this_id, n in complete_count.items() if n > 1}
+        for this_id, idx in groups.items():
+            if (len(idx) + 4*complete_count.get(this_id, 0) != 4):
+                bad_ids[this_id] = len(idx) + 4*complete_count.get(this_id, 0)
+        if bad_ids:
+            raise ValueError('Expected exactly 4 corners per plot. The following plots have a different number of corners: ' + ', '.join(str(i) + ' (' + str(n) + ')' for i, n in bad_ids.items()))
+
+        if groups:
+            # The remaining rows are in file order, so the corners of each plot are in file order as well
+            idx = np.fromiter(itertools.chain.from_iterable(groups.values()), dtype=int, count=len(remaining_ids))
+            first, second, altitude = [column[idx] for column in remaining_columns]
+            remaining_corners, remaining_ab_lines, remaining_end_points, is_longside_first, plot_side_warning_flags = Plot._batch_geometry(self._columns_to_points(first, second, altitude, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone))
+            corners = PointArray.concatenate([corners, remaining_corners])
+            ab_lines = PointArray.concatenate([ab_lines, remaining_ab_lines])
+            flags = np.concatenate([flags, np.stack([is_longside_first, plot_side_warning_flags])], axis=1)
+            first_row = np.concatenate([first_row, remaining_rows[idx[0::4]]])
+            ids = ids + list(groups)
+
+        order = np.argsort(first_row, kind='stable')
+        if np.any(order != np.arange(len(order))):
+            corners = corners[(4*order[:, np.newaxis] + np.arange(4)).ravel()]
+            ab_lines = ab_lines[(2*order[:, np.newaxis] + np.arange(2)).ravel()]
+            flags = flags[:, order]
+            ids = [ids[i] for i in order]
+        is_longside_first, plot_side_warning_flags = flags
+
+        # The ab-lines are immutable, so they are shared as end points (see Plot.batch_from_corners)
+        return Plot._batch_from_geometry(corners, ab_lines, ab_lines, ids, is_longside_first, plot_side_warning_flags, **kwargs)
+
+    @staticmethod
+    def _plot_range_worker(filename, start, stop, offset, shared, is_utm, is_latlon, utm_zone, chunk_size, precision):
+        # Runs in a worker process of _read_plots_parallel. Parses the lines between the byte offsets start and stop, converts them and writes the
+        # geometry of the plots with all 4 corners in the range to the shared buffers, starting at plot offset.
+        #   shared      Name, shape and dtype of each shared buffer
+        #   precision   Floating point type of the parent process, which is not inherited, if the process is spawned
+        # Returns the number of rows in the range, the IDs of the complete plots, the other rows (first, second and altitude column, IDs and row
+        # numbers within the range) and the source of the corners and of the ab-lines.
+        from multiprocessing import shared_memory
+
+        Point.set_precision(precision)
+        with open(filename, 'rb') as fob:
+            fob.seek(start)
+            data = fob.read(stop - start)
+        # Decoded like the text file of _iter_csv_chunks. The range starts at a line boundary, so no character is split.
+        csvreader = csv.reader(io.TextIOWrapper(io.BytesIO(data), newline=''), delimiter=',', quotechar='"')
+        columns = [[np.empty(0, dtype=Point.get_precision())] for k in range(3)] + [[]]
+        while True:
+            with Instrumentation.span('csv.parse'):
+                rows = [row[:4] for row in itertools.islice(csvreader, chunk_size)]
+                if not rows:
+                    break
+                for column, values in zip(columns, Plan._rows_to_columns(rows)):
+                    column.append(values)
+        first, second, altitude = [np.concatenate(column) for column in columns[:3]]
+        plot_id = list(itertools.chain.from_iterable(columns[3]))
+        del data, columns
+
+        complete_ids = []
+        complete_idx = []
+        remaining_idx = []
+        for this_id, idx in Plan._group_rows_by_id(plot_id).items():
+            if (len(idx) == 4):
+                complete_ids.append(this_id)
+                complete_idx.extend(idx)
+            else:
+                remaining_idx.extend(idx)
+        remaining_idx = np.asarray(sorted(remaining_idx), dtype=int)
+        remaining = (first[remaining_idx], second[remaining_idx], altitude[remaining_idx], [plot_id[i] for i in remaining_idx], remaining_idx)
+        if not complete_ids:
+            return len(plot_id), complete_ids, remaining, (None, None)
+
+        complete_idx = np.asarray(complete_idx, dtype=int)
+        corners = Plan._columns_to_points(first[complete_idx], second[complete_idx], altitude[complete_idx], is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone)
+        corners, ab_lines, end_points, is_longside_first, plot_side_warning_flags = Plot._batch_geometry(corners)
+
+        n_plots = len(complete_ids)
+        buffers = {name: shared_memory.SharedMemory(name=buffer_name) for name, (buffer_name, shape, dtype) in shared.items()}
+        arrays = {}
+        try:
+            arrays.update((name, np.ndarray(shape, dtype=dtype, buffer=buffers[name].buf)) for name, (buffer_name, shape, dtype) in shared.items())
+            arrays['corners'][:, 4*offset:4*(offset+n_plots)] = corners.coordinates
+            arrays['corners_zone'][4*offset:4*(offset+n_plots)] = corners.zone
+            arrays['ab_lines'][:, 2*offset:2*(offset+n_plots)] = ab_lines.coordinates
+            arrays['ab_lines_zone'][2*offset:2*(offset+n_plots)] = ab_lines.zone
+            arrays['flags'][0, offset:offset+n_plots] = is_longside_first
+            arrays['flags'][1, offset:offset+n_plots] = plot_side_warning_flags
+            # The row indices of each plot are increasing, so its first row is its first index
+            arrays['first_row'][offset:offset+n_plots] = complete_idx[0::4]
+        finally:
+            # The arrays must be released before the buffers can be closed
+            arrays.clear()
+            for buffer in buffers.values():
+                buffer.close()
+        return len(plot_id), complete_ids, remaining, (corners.source, ab_lines.source)
+
+    @staticmethod
+    def _split_csv(filename, n_ranges, block_size=16777216):
+        # Splits a file into at most n_ranges byte ranges of about the same size, which start at the beginning of a line.
+        # Returns the start, the stop and an upper bound of the number of lines of each range. Line breaks may be \n, \r\n or \r.
+        file_size = os.path.getsize(filename)
+        bounds = [0]
+        with open(filename, 'rb') as fob:
+            for offset in np.linspace(0, file_size, n_ranges + 1)[1:-1].astype(int).tolist():
+                if (offset <= bounds[-1]):
+                    continue
+                # Move to the start of the next line, or stay, if offset is the start of a line
+                fob.seek(offset - 1)
+                fob.readline()
+                if (bounds[-1] < fob.tell() < file_size):
+                    bounds.append(fob.tell())
+            bounds.append(file_size)
+
+            ranges = []
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                fob.seek(start)
+                n_newlines = 0
+                n_returns = 0
+                while fob.tell() < stop:
+                    block = fob.read(min(block_size, stop - fob.tell()))
+                    n_newlines += block.count(b'\n')
+                    n_returns += block.count(b'\r')
+                # The last line of the file may not end with a line break
+                ranges.append((start, stop, max(n_newlines, n_returns) + 1))
+        return ranges
+
+    def iter_plots_csv(self, filename, is_utm=False, is_latlon=False, utm_zone=None, work=True, hitch_height=0.6, working_speed=1.0, pto_rpm=0, chunk_size=65536, progress=None):
+        # Generator yielding the plots of a csv-file (see read_plot_csv) as soon as all 4 corners of a plot have been read.
+        # The file is parsed and converted chunk_size rows at a time, so only the current chunk and the corners of incomplete plots are kept in memory.
+        # Plots are yielded in the order they are completed, which is the file order, when the corners of each plot are consecutive.
+        # Raises a ValueError listing all plots, which do not have exactly 4 corners, after the rest of the file has been yielded.
+
+        pending_points = PointArray()
+        pending_ids = []
+        completed_ids = set()
+        bad_ids = {}
+
+        for first, second, altitude, plot_id in self._iter_csv_chunks(filename, n_columns=4, chunk_size=chunk_size, progress=progress):
+            P = PointArray.concatenate([pending_points, self._columns_to_points(first, second, altitude, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone)])
+            plot_id = pending_ids + plot_id
+
+            complete_ids = []
+            complete_idx = []
+            pending_idx = []
+            for this_id, idx in self._group_rows_by_id(plot_id).items():
+                if (this_id in completed_ids) or (this_id in bad_ids) or (len(idx) > 4):
+                    bad_ids[this_id] = bad_ids.get(this_id, 4 if this_id in completed_ids else 0) + len(idx)
+                elif (len(idx) == 4):
+                    complete_ids.append(this_id)
+                    complete_idx.extend(idx)
                 else:
-                    P.append(Point(x=float(row[0]), y=float(row[1]), altitude=float(row[2])))
-                plot_id.append(str(row[3]))
+                    pending_idx.extend(idx)
 
-        plot_ids_unique = list(set(plot_id))
+            pending_idx.sort()
+            pending_points = P[np.asarray(pending_idx, dtype=int)]
+            pending_ids = [plot_id[idx] for idx in pending_idx]
 
-        plots = []
-        for this_id in plot_ids_unique:
-            corner_points = [p for p, i in zip(P,plot_id) if (i == this_id)]
-            assert(len(corner_points) == 4)
-            
-            plot = Plot(corners=corner_points, ID=this_id, work=work, hitch_height=hitch_height, working_speed=working_speed, pto_rpm=pto_rpm)
-            plots.append(plot)
+            if complete_ids:
+                completed_ids.update(complete_ids)
+                yield from Plot.batch_from_corners(P[np.asarray(complete_idx, dtype=int)], complete_ids, work=work, hitch_height=hitch_height, working_speed=working_speed, pto_rpm=pto_rpm)
 
-        self.plots = plots
+        for this_id, idx in self._group_rows_by_id(pending_ids).items():
+            bad_ids[this_id] = len(idx)
+
+        if bad_ids:
+            raise ValueError('Expected exactly 4 corners per plot. The following plots have a different number of corners: ' + ', '.join(str(i) + ' (' + str(n) + ')' for i, n in bad_ids.items()))
 
     # def from_plot_xls(self, filename, sheetname=None, sheetIdx=0):
     #     wb = load_workbook(filename) # https://openpyxl.readthedocs.io/en/stable/usage.html#read-an-existing-workbook
@@ -69,32 +319,110 @@ class Plan(object):
     #         print(row[0].value)
     #     pass
 
-    def read_field_csv(self, filename, is_utm=False, is_latlon=False):
+    @Instrumentation.timed('read_field_csv')
+    def read_field_csv(self, filename, is_utm=False, is_latlon=False, utm_zone=None, chunk_size=65536, progress=None, simplify_tolerance=None, sort_points=False):
+        #   utm_zone            UTM zone of the coordinates. None estimates it from the east coordinates. See read_plot_csv.
+        #   simplify_tolerance  If given, only the points of the boundary simplified with this tolerance (m) are kept. See Field.simplify.
+        #   sort_points         If True, the points are sorted by their angle around their mean, e.g. for boundaries exported out of order. See Field._sort_points.
+
+        P = PointArray.concatenate([PointArray()] + [self._columns_to_points(first, second, altitude, is_utm=is_utm, is_latlon=is_latlon, utm_zone=utm_zone) for first, second, altitude in self._iter_csv_chunks(filename, n_columns=3, chunk_size=chunk_size, progress=progress)])
+
+        self.field = Field(points=P, sort_points=sort_points)
+        if (simplify_tolerance is not None):
+            self.field = self.field.simplify(simplify_tolerance)
+
+    @staticmethod
+    def _group_rows_by_id(plot_id):
+        # Groups the row indices by plot ID in a single pass. The plots are kept in the order they first appear.
+        corner_idx = {}
+        for idx, this_id in enumerate(plot_id):
+            corner_idx.setdefault(this_id, []).append(idx)
+        return corner_idx
+
+    @staticmethod
+    def _iter_csv_chunks(filename, n_columns, chunk_size=65536, progress=None):
+        # Reads the first n_columns of a csv-file without header chunk_size rows at a time.
+        # For each chunk, the first three columns are returned as float arrays and any remaining columns as lists of strings.
+        # If progress is given, it is called with the fraction of the file read after each chunk.
+        file_size = max(os.path.getsize(filename), 1)
+        chars_read = [0]
+
+        def count_chars(lines):
+            # The position of a text file cannot be told while it is iterated, so count the characters instead
+            for line in lines:
+                chars_read[0] += len(line)
+                yield line
 
-        P = []
         with open(filename, newline='') as csvfile:
-            csvreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            for row in csvreader:
-                if (is_utm):
-                    P.append(Point(north=float(row[0]), east=float(row[1]), altitude=float(row[2])))
-                elif (is_latlon):
-                    P.append(Point(latitude=float(row[0]), longitude=float(row[1]), altitude=float(row[2])))
-                else:
-                    P.append(Point(x=float(row[0]), y=float(row[1]), altitude=float(row[2])))
-
-        self.field = Field(points=P)
-
-    def export_plots(self, filename):
-
-        rows = []
-
-        for plot in self.plots:
-            A = {'latitude': float(plot.ab_line[0].latitude), 'longitude': float(plot.ab_line[0].longitude)}
-            B = {'latitude': float(plot.ab_line[1].latitude), 'longitude': float(plot.ab_line[1].longitude)}
+            csvreader = csv.reader(count_chars(csvfile) if progress is not None else csvfile, delimiter=',', quotechar='"')
+            while True:
+                with Instrumentation.span('csv.parse'):
+                    rows = [row[:n_columns] for row in itertools.islice(csvreader, chunk_size)]
+                    if progress is not None:
+                        progress(min(chars_read[0]/file_size, 1.0))
+                    if not rows:
+                        break
+
+                    chunk = Plan._rows_to_columns(rows)
+                Instrumentation.count('csv.rows', len(rows))
+                yield chunk
+
+    @staticmethod
+    def _rows_to_columns(rows):
+        # Returns the first three columns of the rows of a csv-file as float arrays and any remaining columns as lists of strings
+        columns = list(zip(*rows))
+        first = np.asarray(columns[0], dtype=Point.get_precision())
+        second = np.asarray(columns[1], dtype=Point.get_precision())
+        altitude = np.asarray(columns[2], dtype=Point.get_precision())
+        return (first, second, altitude) + tuple([str(c) for c in column] for column in columns[3:])
+
+    @staticmethod
+    def _columns_to_points(first, second, altitude, is_utm=False, is_latlon=False, utm_zone=None):
+        # Converts the coordinate columns of a csv-file to a PointArray using a single batch conversion.
+        # Column interpretation follows Point(north=first, east=second), Point(latitude=first, longitude=second) and Point(x=first, y=second) respectively.
+        if (is_utm):
+            return PointArray.from_utm(east=second, north=first, zone=utm_zone, altitude=altitude)
+        elif (is_latlon):
+            return PointArray.from_latlon(latitude=first, longitude=second, altitude=altitude)
+
+        # Guess the interpretation of each row based on the size of the numbers
+        x, y = first, second
+        is_row_utm = (y > 90.0) | (y < -90.0) | (x < -180.0) | (x > 180.0)
+        utm_idx = np.flatnonzero(is_row_utm)
+        latlon_idx = np.flatnonzero(~is_row_utm)
+        P_utm = PointArray.from_utm(east=x[utm_idx], north=y[utm_idx], zone=utm_zone, altitude=altitude[utm_idx])
+        P_latlon = PointArray.from_latlon(latitude=y[latlon_idx], longitude=x[latlon_idx], altitude=altitude[latlon_idx])
+        # Restore the row order of the file
+        return PointArray.concatenate([P_utm, P_latlon])[np.argsort(np.concatenate([utm_idx, latlon_idx]))]
+
+    @Instrumentation.timed('export_plots')
+    def export_plots(self, filename, compact=False, progress=None):
+        # Writes the plots in the Robotti json-format. The rows are written one at a time, and the file is only replaced once it has been written completely.
+        #   compact     Write the json-file without indentation and whitespace.
+        #   progress    Optional function, which is called with the fraction (0 to 1) of the plots written so far.
+
+        self._write_json_list(filename, 'rows', self._iter_plot_rows(), compact=compact, progress=progress, n_items=len(self.plots))
+
+    def _iter_plot_rows(self, chunk_size=4096):
+        # Generator yielding the Robotti json-row of each plot. Coordinates are written as float64 regardless of Point.get_precision.
+        # The coordinates are gathered for chunk_size plots at a time (see Plot._gather), so the extra memory does not grow with the number of plots.
+        for start in range(0, len(self.plots), chunk_size):
+            plots = self.plots[start:start+chunk_size]
+            ab_lines = Plot._gather(plots, 'ab_line')
+            end_points = Plot._gather(plots, 'end_points')
+            columns = [np.asarray(values, dtype=np.float64).reshape(len(plots), 2).tolist() for values in [ab_lines.latitude, ab_lines.longitude, end_points.latitude, end_points.longitude]]
+            yield from self._plot_rows(plots, *columns)
+
+    @staticmethod
+    def _plot_rows(plots, ab_latitudes, ab_longitudes, end_point_latitudes, end_point_longitudes):
+        # Generator yielding the Robotti json-rows of the plots from the latitudes and longitudes of their ab-lines and end points (two per plot)
+        for plot, (A_latitude, B_latitude), (A_longitude, B_longitude), (latitude_1, latitude_2), (longitude_1, longitude_2) in zip(plots, ab_latitudes, ab_longitudes, end_point_latitudes, end_point_longitudes):
+            A = {'latitude': A_latitude, 'longitude': A_longitude}
+            B = {'latitude': B_latitude, 'longitude': B_longitude}
             ab_line = {'A': A, 'B': B}
 
-            point_1 = {'latitude': float(plot.end_points[0].latitude), 'longitude': float(plot.end_points[0].longitude)}
-            point_2 = {'latitude': float(plot.end_points[1].latitude), 'longitude': float(plot.end_points[1].longitude)}
+            point_1 = {'latitude': latitude_1, 'longitude': longitude_1}
+            point_2 = {'latitude': latitude_2, 'longitude': longitude_2}
 
             plot_dict = {'id': plot.ID,
                          'point_1': point_1,
@@ -107,20 +435,362 @@ class Plan(object):
                     'plots': [plot_dict],
                     'ignored': 0 if plot.ignored is False else 1,
                     'force_direction': 0 if plot.force_direction is False else 1}
-            rows.append(row)
-        robotti_plan = {'rows': rows}
-        
-        fob = open(filename, 'w')
-        json.dump(robotti_plan, fob, indent=3)
-
-    def export_field(self, filename):
-
-        field_dict = [{'latitude': float(point.latitude), 'longitude': float(point.longitude)} for point in self.field.points]
-
-        robotti_field = {'field': field_dict}
-
-        fob = open(filename, 'w')
-        json.dump(robotti_field, fob, indent=3)
+            yield row
+
+    @Instrumentation.timed('export_field')
+    def export_field(self, filename, compact=False, progress=None, simplify_tolerance=None):
+        # Writes the field in the Robotti json-format. See export_plots.
+        #   simplify_tolerance  If given, the boundary simplified with this tolerance (m) is written instead of all points. See Field.simplify.
+
+        field = self.field.simplify(simplify_tolerance) if simplify_tolerance is not None else self.field
+        field_points = ({'latitude': latitude, 'longitude': longitude} for latitude, longitude in zip(np.asarray(field.points.latitude, dtype=np.float64).tolist(), np.asarray(field.points.longitude, dtype=np.float64).tolist()))
+
+        self._write_json_list(filename, 'field', field_points, compact=compact, progress=progress, n_items=len(field.points))
+
+    @staticmethod
+    def _write_json_list(filename, key, items, compact=False, progress=None, n_items=None):
+        # Writes {key: [items]} to a json-file one item at a time.
+        # Without compact, the output is identical to json.dump(..., indent=3).
+        # The json is written to a temporary file in the same folder, which replaces filename once it is complete.
+        # If progress is given, it is called with the fraction of the n_items items written every _PROGRESS_INTERVAL items and when done.
+        if compact:
+            encoder = json.JSONEncoder(separators=(',', ':'))
+            head, separator, tail, empty = '{' + json.dumps(key) + ':[', ',', ']}', '{' + json.dumps(key) + ':[]}'
+            encode = encoder.encode
+        else:
+            encoder = json.JSONEncoder(indent=3)
+            head, separator, tail, empty = '{\n   ' + json.dumps(key) + ': [\n', ',\n', '\n   ]\n}', '{\n   ' + json.dumps(key) + ': []\n}'
+            encode = lambda item: '      ' + encoder.encode(item).replace('\n', '\n      ')
+
+        fd, temp_filename = Plan._create_temp_file(filename)
+        try:
+            with os.fdopen(fd, 'w') as fob:
+                is_empty = True
+                for i, item in enumerate(items, start=1):
+                    fob.write((head if is_empty else separator) + encode(item))
+                    is_empty = False
+                    if (progress is not None) and (i % Plan._PROGRESS_INTERVAL == 0):
+                        progress(min(i/max(n_items, 1), 1.0))
+                fob.write(empty if is_empty else tail)
+                if not is_empty:
+                    Instrumentation.count('json.items', i)
+                if progress is not None:
+                    progress(1.0)
+            os.replace(temp_filename, filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    @staticmethod
+    def _create_temp_file(filename):
+        # Creates a new temporary file next to filename, which replaces filename once it has been written (see _write_json_list).
+        # Returns the file descriptor (opened for binary writing) and the name of the temporary file.
+        # The file is created with mode 0o666 like a regular open(), so the current umask applies without reading or changing the umask,
+        # which is global to the process. O_EXCL ensures, that an existing file is never reused.
+        folder = os.path.dirname(os.path.abspath(filename))
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+        while True:
+            temp_filename = os.path.join(folder, '.' + os.path.basename(filename) + '.' + os.urandom(6).hex() + '.tmp')
+            try:
+                return os.open(temp_filename, flags, 0o666), temp_filename
+            except FileExistsError:
+                continue
+
+    @Instrumentation.timed('save_project')
+    def save_project(self, filename):
+        # Saves the plan, including the computed geometry and the settings of all plots, in a binary project file, which can be reopened with read_project without any recomputation.
+        # File layout: magic, version (uint16), header length (uint32), json header, and the raw arrays listed in the header, each aligned to _PROJECT_ALIGNMENT bytes.
+        arrays = {}
+        sources = {}
+
+        if self.plots is not None:
+            if not all(plot._has_geometry('corners') and plot._has_geometry('ab_line') and plot._has_geometry('end_points') for plot in self.plots):
+                raise ValueError('Only plots with corners, ab-line and end points can be saved in a project file.')
+            for name in ['corners', 'ab_line', 'end_points']:
+                points = Plot._gather(self.plots, name)
+                arrays[name] = points.coordinates
+                arrays[name + '_zone'] = points.zone
+                sources[name] = points.source
+            arrays['ID'] = np.asarray([str(plot.ID) for plot in self.plots], dtype=str)
+            arrays['is_longside_first'] = np.asarray([plot._longside_idx[0] == 0 for plot in self.plots], dtype=bool)
+            arrays['plot_side_warning_flag'] = np.asarray([plot.plot_side_warning_flag for plot in self.plots], dtype=bool)
+            for name in self._PLOT_SETTINGS:
+                arrays[name] = np.asarray([getattr(plot, name) for plot in self.plots])
+
+        if self.field is not None:
+            arrays['field'] = self.field.points.coordinates
+            arrays['field_zone'] = self.field.points.zone
+            sources['field'] = self.field.points.source
+
+        header = {'plots': self.plots is not None, 'field': self.field is not None, 'sources': sources, 'arrays': {}}
+        offset = 0
+        for name, array in arrays.items():
+            header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // self._PROJECT_ALIGNMENT)*self._PROJECT_ALIGNMENT
+
+        # Offsets in the header are relative to the start of the data, which starts at the first aligned position after the header
+        header_bytes = json.dumps(header).encode('utf-8')
+        preamble = self._PROJECT_MAGIC + struct.pack('<HI', self._PROJECT_VERSION, len(header_bytes)) + header_bytes
+        data_start = -(-len(preamble) // self._PROJECT_ALIGNMENT)*self._PROJECT_ALIGNMENT
+
+        fd, temp_filename = self._create_temp_file(filename)
+        try:
+            with os.fdopen(fd, 'wb') as fob:
+                fob.write(preamble)
+                for name, array in arrays.items():
+                    fob.seek(data_start + header['arrays'][name]['offset'])
+                    fob.write(np.ascontiguousarray(array).tobytes())
+                fob.truncate(data_start + offset)
+            # A memory-mapped file cannot be replaced on Windows, so geometry read from filename is copied into memory first
+            if self._uses_mapped_file(filename):
+                self._copy_mapped_geometry()
+            os.replace(temp_filename, filename)
+        except BaseException:
+            os.remove(temp_filename)
+            raise
+
+    def _uses_mapped_file(self, filename):
+        # Returns True, if any geometry of the plan is a view into a memory map of filename (see read_project)
+        if not os.path.exists(filename):
+            return False
+        arrays = [points.coordinates for points in Plot._point_arrays(self.plots or [])]
+        if (self.field is not None) and (self.field.points is not None):
+            arrays.append(self.field.points.coordinates)
+        # Views of the same array share their base, so each base is only checked once
+        checked = set()
+        for array in arrays:
+            while (array is not None) and (id(array) not in checked):
+                checked.add(id(array))
+                if isinstance(array, np.memmap) and (array.filename is not None) and os.path.samefile(array.filename, filename):
+                    return True
+                array = getattr(array, 'base', None)
+        return False
+
+    def _copy_mapped_geometry(self):
+        # Replaces the geometry of all plots and of the field with copies in memory, which releases memory maps of a project file (see read_project).
+        # The plot objects are kept, so references to them (e.g. in the GUI) stay valid.
+        if self.plots:
+            geometry = [self._copy_points(Plot._gather(self.plots, name)) for name in ['corners', 'ab_line', 'end_points']]
+            is_longside_first = [plot._longside_idx[0] == 0 for plot in self.plots]
+            plot_side_warning_flags = [plot.plot_side_warning_flag for plot in self.plots]
+            Plot._batch_set_geometry(self.plots, *geometry, is_longside_first, plot_side_warning_flags)
+            self._spatial_index = None
+        if (self.field is not None) and (self.field.points is not None):
+            self.field.set_points(self._copy_points(self.field.points))
+
+    @staticmethod
+    def _copy_points(points):
+        # Read-only copy of a PointArray, which does not share memory with it
+        coordinates = points.coordinates.copy()
+        zone = points.zone.copy()
+        coordinates.flags.writeable = False
+        zone.flags.writeable = False
+        return PointArray.from_columns(coordinates, zone, points.source)
+
+    @Instrumentation.timed('read_project')
+    def read_project(self, filename):
+        # Loads a plan saved with save_project. The arrays are memory-mapped and the plots are views into them, so nothing is recomputed.
+        with open(filename, 'rb') as fob:
+            magic = fob.read(len(self._PROJECT_MAGIC))
+            if (magic != self._PROJECT_MAGIC):
+                raise ValueError('"' + str(filename) + '" is not a Research Planner project file.')
+            version, header_length = struct.unpack('<HI', fob.read(struct.calcsize('<HI')))
+            if (version > self._PROJECT_VERSION):
+                raise ValueError('Project file version ' + str(version) + ' is not supported. Newest supported version is ' + str(self._PROJECT_VERSION) + '.')
+            header = json.loads(fob.read(header_length).decode('utf-8'))
+        data_start = -(-(len(self._PROJECT_MAGIC) + struct.calcsize('<HI') + header_length) // self._PROJECT_ALIGNMENT)*self._PROJECT_ALIGNMENT
+
+        arrays = {}
+        for name, info in header['arrays'].items():
+            shape = tuple(info['shape'])
+            if (np.prod(shape) == 0):
+                arrays[name] = np.empty(shape, dtype=info['dtype'])
+            else:
+                # Use a plain ndarray view of the memory map, since slicing np.memmap objects is considerably slower
+                arrays[name] = np.memmap(filename, dtype=info['dtype'], mode='r', offset=data_start + info['offset'], shape=shape).view(np.ndarray)
+
+        plots = None
+        if header['plots']:
+            points = {}
+            for name in ['corners', 'ab_line', 'end_points']:
+                points[name] = PointArray.from_columns(arrays[name], arrays[name + '_zone'], header['sources'][name])
+            plots = Plot._batch_from_geometry(points['corners'], points['ab_line'], points['end_points'], arrays['ID'].tolist(), arrays['is_longside_first'], arrays['plot_side_warning_flag'])
+            for name in self._PLOT_SETTINGS:
+                for plot, value in zip(plots, arrays[name].tolist()):
+                    setattr(plot, name, value)
+
+        field = None
+        if header['field']:
+            field = Field(points=PointArray.from_columns(arrays['field'], arrays['field_zone'], header['sources']['field']))
+
+        self.set_plots(plots)
+        self.field = field
+
+    def set_plots(self, plots):
+        # Replaces the plots of the plan and rebuilds the ID index. Raises a ValueError, if the IDs are not unique.
+        id_index = self._build_id_index(plots) if plots is not None else None
+        self.plots = plots
+        self._id_index = id_index
+        self._id_index_plots = plots
+        self._id_index_size = len(plots) if plots is not None else None
+
+    def add_plots(self, plots):
+        # Appends plots to the plan. Only the new plots are added to the ID index. Raises a ValueError, if an ID is already in the plan.
+        plots = list(plots)
+        if self.plots is None:
+            self.set_plots(plots)
+            return
+        id_index = self._get_id_index()
+        new_index = self._build_id_index(plots, offset=len(self.plots))
+        duplicate_ids = [str(ID) for ID in new_index if ID in id_index]
+        if duplicate_ids:
+            raise ValueError('Plot IDs must be unique. The following IDs are already in the plan: ' + ', '.join(duplicate_ids))
+        id_index.update(new_index)
+        self.plots.extend(plots)
+        self._id_index_size = len(self.plots)
+
+    def remove_plots(self, ids):
+        # Removes the plots with the given IDs from the plan. Raises a ValueError, if an ID is not in the plan.
+        remove_idx = set(self._ids_to_indices(ids))
+        self.set_plots([plot for i, plot in enumerate(self.plots) if i not in remove_idx])
+
+    def get_plot(self, ID, return_index=False):
+        # Returns the plot with the given ID, or None. With return_index, the index of the plot in self.plots is returned instead.
+        if self.plots is None:
+            return None
+        idx = self._get_id_index().get(ID)
+        if (idx is None) or return_index:
+            return idx
+        return self.plots[idx]
+
+    def update_plots(self, ids, **settings):
+        # Sets the settings (see _PLOT_SETTINGS) of the plots with the given IDs, e.g. plan.update_plots(['1', '2'], work=False).
+        # All IDs and settings are validated before any plot is changed. Returns the indices of the updated plots in self.plots.
+        unknown_settings = [name for name in settings if name not in self._PLOT_SETTINGS]
+        if unknown_settings:
+            raise ValueError('Unknown plot settings: ' + ', '.join(unknown_settings) + '. Valid settings are: ' + ', '.join(self._PLOT_SETTINGS))
+        plot_indices = self._ids_to_indices(ids)
+        for i in plot_indices:
+            plot = self.plots[i]
+            for name, value in settings.items():
+                setattr(plot, name, value)
+        return plot_indices
+
+    @Instrumentation.timed('rectify_plots')
+    def rectify_plots(self, ids=None):
+        # Replaces the corners of the plots with the given IDs (default: all plots with corners) by their least-squares best-fit rectangles and
+        # recomputes their ab-lines and end points. All plots are fitted at once (see Plot._batch_rectify). Raises a ValueError, if an ID is not in
+        # the plan or a plot does not have 4 corners.
+        # Returns the indices of the rectified plots in self.plots and the distance (m) each of their corners was moved as (N,4) array.
+        if ids is None:
+            plot_indices = [i for i, plot in enumerate(self.plots or []) if plot._has_geometry('corners')]
+        else:
+            plot_indices = self._ids_to_indices(ids)
+        invalid_ids = [str(self.plots[i].ID) for i in plot_indices if not self.plots[i]._has_geometry('corners', size=4)]
+        if invalid_ids:
+            raise ValueError('Only plots with 4 corners can be rectified. The following plots do not have 4 corners: ' + ', '.join(invalid_ids))
+        if not plot_indices:
+            return plot_indices, np.empty((0, 4))
+
+        residuals = Plot._rectify_plots([self.plots[i] for i in plot_indices])
+        # The corners have moved, so the spatial index is rebuilt, when it is needed next
+        self._spatial_index = None
+        return plot_indices, residuals
+
+    def _ids_to_indices(self, ids):
+        # Looks up the indices of the plots with the given IDs. Raises a ValueError listing all IDs, which are not in the plan.
+        ids = list(ids)
+        id_index = self._get_id_index() if self.plots is not None else {}
+        plot_indices = [id_index.get(ID) for ID in ids]
+        unknown_ids = [str(ID) for ID, idx in zip(ids, plot_indices) if idx is None]
+        if unknown_ids:
+            raise ValueError('The following plot IDs are not in the plan: ' + ', '.join(unknown_ids))
+        return plot_indices
+
+    def _get_id_index(self):
+        # Returns the ID to index map of the plots, in plot order. It is rebuilt, if self.plots has been replaced or changed length outside of set_plots/add_plots/remove_plots.
+        if (self._id_index is None) or (self._id_index_plots is not self.plots) or (self._id_index_size != len(self.plots)):
+            self._id_index = self._build_id_index(self.plots)
+            self._id_index_plots = self.plots
+            self._id_index_size = len(self.plots)
+        return self._id_index
+
+    @staticmethod
+    def _build_id_index(plots, offset=0):
+        # Maps the ID of each plot to its index (plus offset). Raises a ValueError listing all IDs, which occur more than once.
+        id_index = {}
+        for i, plot in enumerate(plots, start=offset):
+            id_index.setdefault(plot.ID, i)
+        if (len(id_index) != len(plots)):
+            duplicate_ids = [str(plot.ID) for i, plot in enumerate(plots, start=offset) if id_index[plot.ID] != i]
+            raise ValueError('Plot IDs must be unique. The following IDs occur more than once: ' + ', '.join(duplicate_ids))
+        return id_index
+
+    def _get_spatial_index(self):
+        # Returns the spatial index of the plots with corners, (re)building it if the plots have been replaced, added or removed since it was built
+        if (self._spatial_index is None) or (self._spatial_index_plots is not self.plots) or (self._spatial_index_size != len(self.plots)):
+            indexed = [i for i, plot in enumerate(self.plots) if plot._has_geometry('corners')]
+            corners = Plot._gather([self.plots[i] for i in indexed], 'corners')
+            polygons = np.stack([corners.east, corners.north], axis=1).reshape(len(indexed), -1, 2)
+            self._spatial_index = SpatialIndex(polygons)
+            self._spatial_index_map = np.asarray(indexed, dtype=int)
+            self._spatial_index_plots = self.plots
+            self._spatial_index_size = len(self.plots)
+        return self._spatial_index
+
+    def plot_at(self, east, north, return_index=False):
+        # Returns the plot containing the point (east, north), or None. With return_index, the index of the plot in self.plots is returned instead.
+        if not self.plots:
+            return None
+        spatial_index = self._get_spatial_index()
+        idx = self._spatial_index_map[spatial_index.query_point(east, north)]
+        if (len(idx) == 0):
+            return None
+        return int(idx[0]) if return_index else self.plots[idx[0]]
+
+    def plots_in_bbox(self, min_east, min_north, max_east, max_north, return_index=False):
+        # Returns the plots whose bounding box overlaps the given bounding box (or their indices in self.plots with return_index)
+        if not self.plots:
+            return []
+        spatial_index = self._get_spatial_index()
+        idx = np.sort(self._spatial_index_map[spatial_index.query_bbox(min_east, min_north, max_east, max_north)])
+        return idx.tolist() if return_index else [self.plots[i] for i in idx]
+
+    def plots_in_polygon(self, polygon, return_index=False):
+        # Returns the plots whose center lies inside the polygon (or their indices in self.plots with return_index)
+        #   polygon     (M,2) array of east and north coordinates or a PointArray
+        if not self.plots:
+            return []
+        if isinstance(polygon, PointArray):
+            polygon = np.stack([polygon.east, polygon.north], axis=1)
+        spatial_index = self._get_spatial_index()
+        idx = np.sort(self._spatial_index_map[spatial_index.query_polygon(polygon)])
+        return idx.tolist() if return_index else [self.plots[i] for i in idx]
+
+    @Instrumentation.timed('validate_plots_in_field')
+    def validate_plots_in_field(self):
+        # Checks that all corners of the plots lie inside the field (see Field.contains).
+        # Returns a boolean array, which is True for each plot in self.plots completely inside the field, and a report listing the plots, which are not.
+        # Plots without corners have nothing to check and are counted as inside.
+        if (self.field is None):
+            raise ValueError('No field to validate the plots against.')
+        if not self.plots:
+            return np.zeros(0, dtype=bool), 'No plots to validate.'
+
+        # The spatial index already holds the corners of all plots as one (N,4,2) array
+        spatial_index = self._get_spatial_index()
+        corner_inside = self.field.contains(spatial_index.polygons.reshape(-1, 2)).reshape(len(spatial_index), -1)
+        plot_inside = np.ones(len(self.plots), dtype=bool)
+        plot_inside[self._spatial_index_map] = corner_inside.all(axis=1)
+
+        outside = np.flatnonzero(~plot_inside)
+        if (len(outside) == 0):
+            return plot_inside, 'All ' + str(len(self.plots)) + ' plots are inside the field.'
+        n_corners_outside = dict(zip(self._spatial_index_map, np.count_nonzero(~corner_inside, axis=1)))
+        listed = [str(self.plots[i].ID) + ' (' + str(n_corners_outside[i]) + ' corners outside)' for i in outside[:self._REPORT_MAX_PLOTS]]
+        if (len(outside) > self._REPORT_MAX_PLOTS):
+            listed.append('and ' + str(len(outside) - self._REPORT_MAX_PLOTS) + ' more')
+        return plot_inside, str(len(outside)) + ' of ' + str(len(self.plots)) + ' plots are not completely inside the field: ' + ', '.join(listed)
 
     def to_json(self, filename):
         # fob = open(filename, 'w')
@@ -128,24 +798,21 @@ class Plan(object):
         pass
 
     def draw(self, ax=None, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, show_field=True):
-        if (ax is None):
-            ax = plt.gca()
-
-        if (self.field is not None and show_field):
-            self.field.draw(ax=ax)
-        
-        if (self.plots is not None):
-            for plot in self.plots:
-
-                if (hide_idle_plots and (not plot.work or plot.ignored)):
-                    idle_alpha = 0.3
-                else:
-                    idle_alpha = 1.0
-
-                plot.draw(ax=ax, show_ID=show_ID, show_plot=show_plot, show_AB_line=show_AB_line, show_AB=show_AB, show_end_points=show_end_points, idle_alpha=idle_alpha)
-
-        ax.axis('equal')
-        ax.set_xlabel('East, m')
-        ax.set_ylabel('North, m')
-
-        return ax
+        # Drawing is implemented in Rendering, which is only imported here, so the plan can be used without matplotlib. See Rendering.draw_plan.
+        import Rendering
+        return Rendering.draw_plan(self, ax=ax, show_ID=show_ID, show_plot=show_plot, show_AB_line=show_AB_line, show_AB=show_AB, show_end_points=show_end_points, hide_idle_plots=hide_idle_plots, show_field=show_field)
+
+    def draw_plots(self, ax, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, hatch=True, end_point_markers=True, plot_indices=None):
+        # See Rendering.draw_plots
+        import Rendering
+        return Rendering.draw_plots(self, ax, show_ID=show_ID, show_plot=show_plot, show_AB_line=show_AB_line, show_AB=show_AB, show_end_points=show_end_points, hide_idle_plots=hide_idle_plots, hatch=hatch, end_point_markers=end_point_markers, plot_indices=plot_indices)
+
+    def draw_plot_details(self, ax, plot_indices, show_ID=True, show_hatch=True, show_AB=True, show_end_point_markers=True, hide_idle_plots=True):
+        # See Rendering.draw_plot_details
+        import Rendering
+        return Rendering.draw_plot_details(self, ax, plot_indices, show_ID=show_ID, show_hatch=show_hatch, show_AB=show_AB, show_end_point_markers=show_end_point_markers, hide_idle_plots=hide_idle_plots)
+
+    def restyle_plots(self, artists, plot_indices=None, hide_idle_plots=True):
+        # See Rendering.restyle_plots
+        import Rendering
+        Rendering.restyle_plots(self, artists, plot_indices=plot_indices, hide_idle_plots=hide_idle_plots)
@@ -1,28 +1,44 @@
-import copy
 import numpy as np
-from Point import Point
+from Point import Point, PointArray
+import Instrumentation
 
-class Plot(object):
+# Indices of the long and short sides of plots with sorted corners, shared by all plots, which have them
+_LONGSIDE_FIRST = ([0, 1, 2, 3], [1, 2, 3, 0])
+_SHORTSIDE_FIRST = ([1, 2, 3, 0], [0, 1, 2, 3])
 
-    ID = None
-    corners = None
-    ab_line = None
-    end_points = None
-    width = None
-    ignored = False
-    force_direction = False
+class _PlotBatch(object):
+    # Geometry of plots created together (see Plot._batch_set_geometry). Plot i of a batch has the corners 4*i to 4*i+3 and the ab-line
+    # and end points 2*i and 2*i+1 of the PointArrays.
+    __slots__ = ('corners', 'ab_line', 'end_points')
 
-    work = True
-    hitch_height = 0.0
-    working_speed = 1.0
-    pto_rpm = 0
+    _SIZES = {'corners': 4, 'ab_line': 2, 'end_points': 2}
 
-    _source = None
+    def __init__(self, corners, ab_line, end_points):
+        self.corners = corners
+        self.ab_line = ab_line
+        self.end_points = end_points
 
-    _corners_are_sorted = False
+    def get(self, name, index):
+        # Returns the corners, ab-line or end points of plot index as a view
+        size = self._SIZES[name]
+        return getattr(self, name)[size*index:size*index+size]
 
-    _longside_idx = None
-    _shortside_idx = None
+    def take(self, name, indices):
+        # Returns the corners, ab-lines or end points of the plots indices as one PointArray. All plots in order gives the batch itself.
+        points = getattr(self, name)
+        size = self._SIZES[name]
+        indices = np.asarray(indices, dtype=int)
+        if (len(indices)*size == len(points)) and np.array_equal(indices, np.arange(len(indices))):
+            return points
+        return points[(size*indices[:, np.newaxis] + np.arange(size)).ravel()]
+# End of class _PlotBatch
+
+class Plot(object):
+    # Plots created in batches (batch_from_corners, read_plot_csv, read_project) only store a reference to the geometry of the batch and their
+    # index into it, so a plot takes a few hundred bytes. corners, ab_line and end_points create their views on access. Setting one of them
+    # gives the plot its own geometry.
+    __slots__ = ('ID', '_corners', '_ab_line', '_end_points', '_batch', '_batch_index', 'width', 'ignored', 'force_direction', 'plot_side_warning_flag',
+                 'work', 'hitch_height', 'working_speed', 'pto_rpm', '_source', '_corners_are_sorted', '_longside_idx', '_shortside_idx')
 
     _HITCH_HEIGHT_MIN = 0.16
     _HITCH_HEIGHT_MAX = 0.6
@@ -32,31 +48,274 @@ class Plot(object):
     _PTO_RPM_MAX = 1000
 
     def __init__(self, corners=None, ab_line=None, end_points=None, width=None, ID=None, ignored=False, force_direction=False, work=True, hitch_height=0.6, working_speed=1.0, pto_rpm=0):
+        self._batch = None
+        self._batch_index = None
+        self._corners = None
+        self._ab_line = None
+        self._end_points = None
+        self.width = None
+        self.plot_side_warning_flag = False
+        self._source = None
+        self._corners_are_sorted = False
+        self._longside_idx = None
+        self._shortside_idx = None
+
         if corners is not None:
-            self.corners = copy.deepcopy(corners)
+            if not isinstance(corners, PointArray):
+                corners = PointArray.from_points(corners)
+            self.corners = corners
             self._source = 'corners'
             self._sort_corners()
-            plot_side_warning_flag = self._corners_to_ab_line(corners)
+            self.plot_side_warning_flag = self._corners_to_ab_line(corners)
 
         elif ab_line is not None and end_points is not None:
             # Estimate corners
             self._source = 'ab_line'
-            self.ab_line = copy.deepcopy(ab_line)
-            self.end_points = copy.deepcopy(end_points)
-            self.width = copy.deepcopy(width)
+            self.ab_line = ab_line if isinstance(ab_line, PointArray) else PointArray.from_points(ab_line)
+            self.end_points = end_points if isinstance(end_points, PointArray) else PointArray.from_points(end_points)
+            self.width = width
             if (width is not None):
                 #TODO: Estimate corners
                 pass
         else:
             pass
         
-        self.ID = copy.deepcopy(ID)
-        self.force_direction = copy.deepcopy(force_direction)
-        self.ignored = copy.deepcopy(ignored)
-        self.work = copy.deepcopy(work)
-        self.hitch_height = copy.deepcopy(hitch_height)
-        self.working_speed = copy.deepcopy(working_speed)
-        self.pto_rpm = copy.deepcopy(pto_rpm)
+        self.ID = ID
+        self.force_direction = force_direction
+        self.ignored = ignored
+        self.work = work
+        self.hitch_height = hitch_height
+        self.working_speed = working_speed
+        self.pto_rpm = pto_rpm
+
+    @property
+    def corners(self):
+        if self._batch is not None:
+            return self._batch.get('corners', self._batch_index)
+        return self._corners
+
+    @corners.setter
+    def corners(self, corners):
+        self._detach()
+        self._corners = corners
+
+    @property
+    def ab_line(self):
+        if self._batch is not None:
+            return self._batch.get('ab_line', self._batch_index)
+        return self._ab_line
+
+    @ab_line.setter
+    def ab_line(self, ab_line):
+        self._detach()
+        self._ab_line = ab_line
+
+    @property
+    def end_points(self):
+        if self._batch is not None:
+            return self._batch.get('end_points', self._batch_index)
+        return self._end_points
+
+    @end_points.setter
+    def end_points(self, end_points):
+        self._detach()
+        self._end_points = end_points
+
+    def _detach(self):
+        # Replaces the reference to the batch by views of the plot's own geometry
+        if self._batch is not None:
+            self._corners, self._ab_line, self._end_points = self.corners, self.ab_line, self.end_points
+            self._batch = None
+            self._batch_index = None
+
+    def _has_geometry(self, name, size=None):
+        # Same as getattr(self, name) is not None (and has size points), without creating a view
+        if self._batch is not None:
+            return (size is None) or (size == _PlotBatch._SIZES[name])
+        points = getattr(self, '_' + name)
+        return (points is not None) and ((size is None) or (len(points) == size))
+
+    @staticmethod
+    def _point_arrays(plots):
+        # Returns the PointArrays holding the geometry of the plots: those of their batches (once per batch) and the geometry of the other plots
+        batches = {}
+        point_arrays = []
+        for plot in plots:
+            if plot._batch is not None:
+                batches[id(plot._batch)] = plot._batch
+            else:
+                point_arrays += [points for points in [plot._corners, plot._ab_line, plot._end_points] if points is not None]
+        return [getattr(batch, name) for batch in batches.values() for name in ['corners', 'ab_line', 'end_points']] + point_arrays
+
+    @staticmethod
+    def _gather(plots, name):
+        # Returns the corners, ab-lines or end points (name) of the plots, which must all have them, as one PointArray.
+        # Consecutive plots of the same batch are taken from it at once (see _PlotBatch.take), so no views of single plots are created.
+        parts = [PointArray()]
+        batch = None
+        indices = []
+        for plot in plots:
+            if (batch is not None) and (plot._batch is not batch):
+                parts.append(batch.take(name, indices))
+                batch = None
+            if plot._batch is None:
+                parts.append(getattr(plot, name))
+            elif batch is None:
+                batch = plot._batch
+                indices = [plot._batch_index]
+            else:
+                indices.append(plot._batch_index)
+        if batch is not None:
+            parts.append(batch.take(name, indices))
+        return parts[1] if len(parts) == 2 else PointArray.concatenate(parts)
+
+    @classmethod
+    def batch_from_corners(cls, corners, ids, zone=None, **kwargs):
+        # Create N plots at once from their corners. Sorting of the corners, long- and short sides, side warnings, AB-lines and end points are computed for all plots as (N,4) array operations.
+        #   corners     Either a (N,4,2) array of east and north coordinates or a PointArray with 4*N points, where the corners of each plot are consecutive.
+        #   ids         List of N plot IDs.
+        #   zone        UTM zone used, if corners is an array. See PointArray.from_utm.
+        #   kwargs      Settings applied to all plots (ignored, force_direction, work, hitch_height, working_speed, pto_rpm).
+        corners, ab_lines, end_points, is_longside_first, plot_side_warning_flags = cls._batch_geometry(corners, zone=zone)
+        return cls._batch_from_geometry(corners, ab_lines, end_points, ids, is_longside_first, plot_side_warning_flags, **kwargs)
+
+    @staticmethod
+    @Instrumentation.timed('plot.geometry')
+    def _batch_geometry(corners, zone=None):
+        # The geometry of batch_from_corners without creating the plots, e.g. for computing it in worker processes (see Plan.read_plot_csv).
+        # Returns the sorted corners, ab-lines and end points as PointArrays and the per plot arrays is_longside_first and plot_side_warning_flags.
+        if not isinstance(corners, PointArray):
+            corners = np.asarray(corners, dtype=Point.get_precision())
+            corners = PointArray.from_utm(east=corners[:,:,0].ravel(), north=corners[:,:,1].ravel(), zone=zone)
+
+        n_plots = len(corners)//4
+        east = corners.east.reshape(n_plots, 4)
+        north = corners.north.reshape(n_plots, 4)
+
+        # Step 1: Sort the points in anti-clockwise order
+        theta = np.arctan2(north - north.mean(axis=1, keepdims=True), east - east.mean(axis=1, keepdims=True))
+        order = np.argsort(theta, axis=1, kind='stable') + 4*np.arange(n_plots)[:, np.newaxis]
+        corners = corners[order.ravel()]
+        east = corners.east.reshape(n_plots, 4)
+        north = corners.north.reshape(n_plots, 4)
+
+        # Step 2: Determine short side and long side of plots. Column i of d is the distance between corner i and i+1.
+        d = np.hypot(np.roll(east, -1, axis=1) - east, np.roll(north, -1, axis=1) - north)
+        plot_side_warning_flags = (np.abs(d[:,0] - d[:,2]) > 0.05) | (np.abs(d[:,1] - d[:,3]) > 0.05)
+        is_longside_first = d[:,0] + d[:,2] > d[:,1] + d[:,3]
+
+        # Step 3: Determine ab-lines as the midpoints of the short sides
+        ab_lines = Plot._batch_ab_lines(east, north, is_longside_first)
+        ab_zone = corners.zone.reshape(n_plots, 4)[:, [0, 0]].ravel()
+        ab_lines = PointArray.from_utm(east=ab_lines[:,:,0].ravel(), north=ab_lines[:,:,1].ravel(), zone=ab_zone)
+
+        # Step 4: Set point_1 to A, and point_2 to B. The ab-lines are immutable, so they are shared instead of copied.
+        end_points = ab_lines
+
+        return corners, ab_lines, end_points, is_longside_first, plot_side_warning_flags
+
+    @staticmethod
+    def _batch_ab_lines(east, north, is_longside_first):
+        # Returns the ab-lines of N plots as (N,2,2) array with the east and north coordinates of A and B, the midpoints of the short sides.
+        #   east, north         (N,4) arrays of the sorted corners
+        #   is_longside_first   Per plot, True if the side between corner 0 and 1 is a long side
+        # If the first side is a long side, the short sides are 1-2 and 3-0. Otherwise, they are 0-1 and 2-3.
+        rows = np.arange(len(east))
+        shift = np.asarray(is_longside_first).astype(int)
+        A_east = (east[rows, shift] + east[rows, shift + 1])/2.0
+        A_north = (north[rows, shift] + north[rows, shift + 1])/2.0
+        B_east = (east[rows, shift + 2] + east[rows, (shift + 3) % 4])/2.0
+        B_north = (north[rows, shift + 2] + north[rows, (shift + 3) % 4])/2.0
+        return np.stack([np.stack([A_east, A_north], axis=1), np.stack([B_east, B_north], axis=1)], axis=1)
+
+    @classmethod
+    @Instrumentation.timed('plot.create')
+    def _batch_from_geometry(cls, corners, ab_lines, end_points, ids, is_longside_first, plot_side_warning_flags, **kwargs):
+        # Create N plots from already computed geometry without any recomputation.
+        # The plots share the PointArrays of all plots (see _PlotBatch).
+        #   corners             PointArray with the 4*N sorted corners
+        #   ab_lines            PointArray with the 2*N points of the ab-lines
+        #   end_points          PointArray with the 2*N end points
+        #   is_longside_first   Per plot, True if the side between corner 0 and 1 is a long side
+        plots = [cls(ID=this_id, **kwargs) for this_id in ids]
+        cls._batch_set_geometry(plots, corners, ab_lines, end_points, is_longside_first, plot_side_warning_flags)
+
+        Instrumentation.count('plots.built', len(plots))
+        return plots
+
+    @staticmethod
+    def _batch_set_geometry(plots, corners, ab_lines, end_points, is_longside_first, plot_side_warning_flags):
+        # Sets the geometry of N existing plots. See _batch_from_geometry.
+        batch = _PlotBatch(corners, ab_lines, end_points)
+        for i, (plot, longside_first, plot_side_warning_flag) in enumerate(zip(plots, np.asarray(is_longside_first).tolist(), np.asarray(plot_side_warning_flags).tolist())):
+            plot._batch = batch
+            plot._batch_index = i
+            plot._corners = None
+            plot._ab_line = None
+            plot._end_points = None
+            plot._source = 'corners'
+            plot._longside_idx = _LONGSIDE_FIRST[0] if longside_first else _LONGSIDE_FIRST[1]
+            plot._shortside_idx = _SHORTSIDE_FIRST[0] if longside_first else _SHORTSIDE_FIRST[1]
+            plot._corners_are_sorted = True
+            plot.plot_side_warning_flag = bool(plot_side_warning_flag)
+
+    @staticmethod
+    @Instrumentation.timed('plot.rectify')
+    def _batch_rectify(corners):
+        # Least-squares best-fit rectangles of N plots at once.
+        #   corners     (N,4,2) array with the east and north coordinates of the corners of each plot in anti-clockwise order (as sorted by _batch_geometry)
+        # Returns the rectangles as (N,4,2) array with the corners in the same order, their ab-lines as (N,2,2) array (see _batch_ab_lines),
+        # the distance each corner was moved as (N,4) array of residuals and, per plot, if the side between corner 0 and 1 is a long side.
+        #
+        # Corner k of a rectangle with the center c, the axes e1 and e2 (e1 rotated 90 degrees) and the half side lengths a and b is
+        # c + s1[k]*a*e1 + s2[k]*b*e2 with the signs (s1, s2) = (-,-), (+,-), (+,+), (-,+) of anti-clockwise corners. For given axes, the sum of the
+        # squared distances to the corners p[k] is smallest for c = mean(p), a = U.e1/4 and b = V.e2/4, where U = sum(s1[k]*(p[k] - c)) and
+        # V = sum(s2[k]*(p[k] - c)). The best axes maximize (U.e1)^2 + (V.e2)^2 = e1'(UU' + WW')e1 with W = V rotated -90 degrees, so e1 is the
+        # principal eigenvector of a symmetric 2x2 matrix, which has a closed form. Hence all plots are solved at once without iterations.
+        corners = np.asarray(corners, dtype=Point.get_precision())
+        s1 = np.array([-1.0, 1.0, 1.0, -1.0])
+        s2 = np.array([-1.0, -1.0, 1.0, 1.0])
+
+        # Relative to the center, the coordinates are small, so UTM coordinates keep their precision
+        center = corners.mean(axis=1, keepdims=True)
+        r = corners - center
+        U = np.einsum('k,nkd->nd', s1, r)
+        V = np.einsum('k,nkd->nd', s2, r)
+        W = np.stack([V[:,1], -V[:,0]], axis=1)
+        M_xx = U[:,0]*U[:,0] + W[:,0]*W[:,0]
+        M_yy = U[:,1]*U[:,1] + W[:,1]*W[:,1]
+        M_xy = U[:,0]*U[:,1] + W[:,0]*W[:,1]
+        theta = np.arctan2(2*M_xy, M_xx - M_yy)/2
+        e1 = np.stack([np.cos(theta), np.sin(theta)], axis=1)
+        e2 = np.stack([-np.sin(theta), np.cos(theta)], axis=1)
+        a = np.sum(U*e1, axis=1)/4
+        b = np.sum(V*e2, axis=1)/4
+
+        rectified = center + (s1[np.newaxis, :, np.newaxis]*(a[:, np.newaxis]*e1)[:, np.newaxis, :]
+                              + s2[np.newaxis, :, np.newaxis]*(b[:, np.newaxis]*e2)[:, np.newaxis, :])
+        residuals = np.hypot(rectified[:,:,0] - corners[:,:,0], rectified[:,:,1] - corners[:,:,1])
+        # The sides 0-1 and 2-3 have the length 2|a|, the sides 1-2 and 3-0 have the length 2|b|
+        is_longside_first = np.abs(a) > np.abs(b)
+        ab_lines = Plot._batch_ab_lines(rectified[:,:,0], rectified[:,:,1], is_longside_first)
+        return rectified, ab_lines, residuals, is_longside_first
+
+    @staticmethod
+    def _rectify_plots(plots):
+        # Replaces the corners of the plots by their best-fit rectangles (see _batch_rectify) and sets their ab-lines and end points accordingly.
+        # All plots must have 4 sorted corners. The plots share the new geometry, as with batch_from_corners.
+        # Returns the distance each corner was moved as (N,4) array.
+        corners = Plot._gather(plots, 'corners')
+        n_plots = len(plots)
+        rectified, ab_lines, residuals, is_longside_first = Plot._batch_rectify(np.stack([corners.east, corners.north], axis=1).reshape(n_plots, 4, 2))
+
+        zone = corners.zone
+        ab_zone = zone.reshape(n_plots, 4)[:, [0, 0]].ravel()
+        # Only the east and north coordinates are fitted, so the corners keep their altitude
+        corners = PointArray.from_utm(east=rectified[:,:,0].ravel(), north=rectified[:,:,1].ravel(), zone=zone, altitude=corners.altitude)
+        ab_lines = PointArray.from_utm(east=ab_lines[:,:,0].ravel(), north=ab_lines[:,:,1].ravel(), zone=ab_zone)
+        # Opposite sides of a rectangle have the same length, so no plot has a side warning
+        Plot._batch_set_geometry(plots, corners, ab_lines, ab_lines, is_longside_first, np.zeros(n_plots, dtype=bool))
+        return residuals
 
     def __str__(self):
         str_out = ''
@@ -73,14 +332,15 @@ class Plot(object):
         
         return str_out
 
+    @Instrumentation.timed('plot.sort_corners')
     def _sort_corners(self):
         plot_side_warning_flag = False
 
         # Step 1: Sort the points in anti-clockwise order
-        x = np.asarray([p.east for p in self.corners])
-        y = np.asarray([p.north for p in self.corners])
+        x = self.corners.east
+        y = self.corners.north
         theta = np.arctan2(y-np.mean(y),x-np.mean(x))
-        theta, corners = (list(t) for t in zip(*sorted(zip(theta, self.corners))))
+        corners = self.corners[np.argsort(theta, kind='stable')]
 
         # Step 2: Determine short side and long side of plot
         d01 = corners[0].distance(corners[1])
@@ -92,11 +352,11 @@ class Plot(object):
             plot_side_warning_flag = True
 
         if (d01 + d23 > d12 + d30):
-            longside_idx = [0, 1, 2, 3]
-            shortside_idx = [1, 2, 3, 0]
+            longside_idx = _LONGSIDE_FIRST[0]
+            shortside_idx = _SHORTSIDE_FIRST[0]
         else:
-            longside_idx = [1, 2, 3, 0]
-            shortside_idx = [0, 1, 2, 3]
+            longside_idx = _LONGSIDE_FIRST[1]
+            shortside_idx = _SHORTSIDE_FIRST[1]
 
         self.corners = corners
         self._longside_idx = longside_idx
@@ -114,50 +374,29 @@ class Plot(object):
         # Step 3: Determine ab-line from long side (and short sides)
         A = Point.midpoint([self.corners[self._shortside_idx[0]], self.corners[self._shortside_idx[1]]], method='utm')
         B = Point.midpoint([self.corners[self._shortside_idx[2]], self.corners[self._shortside_idx[3]]], method='utm')
-        ab_line = [A, B]
+        ab_line = PointArray.from_points([A, B])
 
         # Step 4: Determine point_1 and point_2 from ab-line intersection with short sides of plot
-        # Set point_1 to A, and point_2 to B
-        point_1 = copy.deepcopy(A)
-        point_2 = copy.deepcopy(B)
-        end_points = [point_1, point_2]
+        # Set point_1 to A, and point_2 to B. The ab-line is immutable, so it is shared instead of copied.
+        end_points = ab_line
 
         # Step 5: Calculate width of plot
         # width = self.corners[self._shortside_idx[0]].distance(self.corners[self._shortside_idx[1]])
 
-        self.ab_line = copy.deepcopy(ab_line)
-        self.end_points = copy.deepcopy(end_points)
+        self.ab_line = ab_line
+        self.end_points = end_points
 
         return plot_side_warning_flag
 
     def _rectify_plot(self):
-        # Turn approximately rectangular plot into a rectangular plot
-        pass
+        # Turn approximately rectangular plot into a rectangular plot (the least-squares best-fit rectangle of the corners, see _batch_rectify).
+        # The ab-line and end points are recomputed from the rectangle. Returns the distance each corner was moved.
+        if (self.corners is None) or (len(self.corners) != 4):
+            raise ValueError('Only plots with 4 corners can be rectified.')
+        return self._rectify_plots([self])[0]
 
     def draw(self, ax, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, idle_alpha=0.3):
-
-        if (self.corners is not None) and (show_plot):
-            east = [point.east for point in self.corners]
-            north = [point.north for point in self.corners]
-            ax.fill(east, north, edgecolor=[0,0,0],hatch='///', alpha=0.3*idle_alpha)
-
-        if (self.ab_line is not None) and (show_AB_line):
-            east = [point.east for point in self.ab_line]
-            north = [point.north for point in self.ab_line]
-            ax.plot(east, north, marker='', linestyle='solid', color='grey', linewidth=2, alpha=idle_alpha)
-            if show_AB:
-                ax.text(east[0], north[0], 'A', horizontalalignment='center', verticalalignment='center', alpha=idle_alpha)
-                ax.text(east[1], north[1], 'B', horizontalalignment='center', verticalalignment='center', alpha=idle_alpha)
-
-        if (self.end_points is not None) and (show_end_points):
-            east = [point.east for point in self.end_points]
-            north = [point.north for point in self.end_points]
-            ax.plot(east, north, marker='.', linestyle='dashed', color='black', linewidth=1, alpha=idle_alpha)
-            
-        if (show_ID and self.ID is not None):
-            if (self.corners is not None):
-                point = Point.midpoint(self.corners)
-            else:
-                point = Point.midpoint(self.end_points)
-            ax.text(point.east, point.north, str(self.ID), horizontalalignment='center', verticalalignment='center', alpha=idle_alpha, picker=100)
+        # See Rendering.draw_plot
+        import Rendering
+        Rendering.draw_plot(self, ax, show_ID=show_ID, show_plot=show_plot, show_AB_line=show_AB_line, show_AB=show_AB, show_end_points=show_end_points, hide_idle_plots=hide_idle_plots, idle_alpha=idle_alpha)
 # End of class Plot
\ No newline at end of file
@@ -1,15 +1,71 @@
+import collections
+import threading
 import numpy as np
 import utm
+import Instrumentation
+
+
+class _ConversionCache(object):
+    # Bounded least-recently-used cache for coordinate conversions with hit/miss statistics.
+    # A maxsize of 0 disables the cache. The cache is shared by all threads, e.g. the GUI and its background workers, so all access is locked.
+
+    def __init__(self, maxsize=65536):
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if (self.maxsize <= 0):
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
 
 class Point(object):
-    latitude = None
-    longitude = None
-    altitude = None # Altidude is only used for reference. All calculations are made without the altitude
-    east = None
-    north = None
-    zone = None
-    ID = None
-    _source = None
+    # Immutable point. Points can be shared between plots, fields and plans without copying.
+    #   altitude    Altidude is only used for reference. All calculations are made without the altitude
+    __slots__ = ('latitude', 'longitude', 'altitude', 'east', 'north', 'zone', '_source')
+
+    # UTM/latitude-longitude conversions of single points are cached on coordinates rounded to about 0.1 mm.
+    # Conversions of arrays (from_arrays, from_latlon_arrays, PointArray) are vectorized and bypass the cache.
+    _CACHE_UTM_DECIMALS = 4
+    _CACHE_LATLON_DECIMALS = 9
+    _conversion_cache = _ConversionCache()
+
+    # Floating point type of all coordinates. See set_precision.
+    _float_type = np.float64
 
     def __init__(self, x=None, y=None, latitude=None, longitude=None, altitude=None, east=None, north=None, zone=None):
         
@@ -25,16 +81,16 @@ class Point(object):
                 longitude = x
 
         if (latitude is not None and longitude is not None):
-            latitude = np.longdouble(latitude)
-            longitude = np.longdouble(longitude)
+            latitude = self._float_type(latitude)
+            longitude = self._float_type(longitude)
             east, north, zone = self._to_utm(latitude, longitude)
             _source = 'latlon'
 
         elif (east is not None and north is not None):
             if (zone is None):
                 zone = self._utm_estimate_zone(east)
-            east = np.longdouble(east)
-            north = np.longdouble(north)
+            east = self._float_type(east)
+            north = self._float_type(north)
             latitude, longitude = self._to_latlon(east, north, zone)
             _source = 'utm'
 
@@ -42,14 +98,41 @@ class Point(object):
             #TODO: Raise error
             pass
         
-        self.latitude = latitude
-        self.longitude = longitude
-        self.altitude = altitude
-        self.east = east
-        self.north = north
-        self.zone = zone
-        self._source = _source
-    
+        self._set_values(latitude, longitude, altitude, east, north, zone, _source)
+
+    def _set_values(self, latitude, longitude, altitude, east, north, zone, source):
+        # Only used while constructing the point. Afterwards the point is immutable.
+        object.__setattr__(self, 'latitude', latitude)
+        object.__setattr__(self, 'longitude', longitude)
+        object.__setattr__(self, 'altitude', altitude)
+        object.__setattr__(self, 'east', east)
+        object.__setattr__(self, 'north', north)
+        object.__setattr__(self, 'zone', zone)
+        object.__setattr__(self, '_source', source)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Point is immutable. Create a new Point instead of setting ' + str(name) + '.')
+
+    def __delattr__(self, name):
+        raise AttributeError('Point is immutable. Cannot delete ' + str(name) + '.')
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Point._from_values, (self.latitude, self.longitude, self.altitude, self.east, self.north, self.zone, self._source))
+
+    def __eq__(self, other):
+        if not isinstance(other, Point):
+            return NotImplemented
+        return (self.east, self.north, self.zone, self.latitude, self.longitude, self.altitude) == (other.east, other.north, other.zone, other.latitude, other.longitude, other.altitude)
+
+    def __hash__(self):
+        return hash((self.east, self.north, self.zone, self.latitude, self.longitude, self.altitude))
+
     def __str__(self):
         str_out = ''
         if (self._source == 'latlon'):
@@ -73,29 +156,157 @@ class Point(object):
         # Divide point with a scalar
         pass
 
+    @classmethod
+    def set_precision(cls, precision):
+        # Sets the floating point type used for the coordinates of all new points and point arrays.
+        #   precision   'float64' (default) or 'longdouble'.
+        # float64 keeps the round-trip error of UTM/latitude-longitude conversions well below 1 mm (see benchmarks/bench_precision.py) and allows vectorized arithmetic.
+        # longdouble is 80-bit extended precision on x86, which is considerably slower and only kept for reference.
+        float_type = np.dtype(precision).type
+        if float_type not in (np.float64, np.longdouble):
+            raise ValueError('Unsupported precision ' + str(precision) + '. Use float64 or longdouble.')
+        cls._float_type = float_type
+        cls._conversion_cache.clear()
+
+    @classmethod
+    def get_precision(cls):
+        # Returns the floating point dtype used for coordinates
+        return np.dtype(cls._float_type)
+
+    @classmethod
+    def set_conversion_cache_size(cls, maxsize):
+        # Sets the maximum number of cached conversions. Use 0 to disable the cache.
+        cls._conversion_cache.resize(maxsize)
+
+    @classmethod
+    def conversion_cache_info(cls):
+        # Returns the hits, misses, current size and maximum size of the conversion cache
+        return cls._conversion_cache.info()
+
+    @classmethod
+    def clear_conversion_cache(cls):
+        cls._conversion_cache.clear()
+
     def _to_latlon(self, east, north, zone=None):
         if (zone is None):
             zone = self._utm_estimate_zone(east)
-        northern = True if north > 0 else False
-        latitude, longitude = utm.to_latlon(east, np.abs(north), zone, northern=northern)
-        return np.longdouble(latitude), np.longdouble(longitude)
-    
+        key = ('latlon', round(float(east), self._CACHE_UTM_DECIMALS), round(float(north), self._CACHE_UTM_DECIMALS), int(zone))
+        latlon = self._conversion_cache.get(key)
+        if latlon is None:
+            northern = True if north > 0 else False
+            Instrumentation.count('points.converted')
+            latitude, longitude = utm.to_latlon(east, np.abs(north), zone, northern=northern)
+            latlon = (self._float_type(latitude), self._float_type(longitude))
+            self._conversion_cache.put(key, latlon)
+        return latlon
+
     def _to_utm(self, latitude, longitude):
-        east, north, zone, zone_letter = utm.from_latlon(latitude, longitude)
-        east = np.longdouble(east)
-        north = np.longdouble(north)
-        north = north if (zone_letter >= 'N') else np.longdouble(-1.0)*north
-        return east, north, zone
+        key = ('utm', round(float(latitude), self._CACHE_LATLON_DECIMALS), round(float(longitude), self._CACHE_LATLON_DECIMALS))
+        utm_coordinates = self._conversion_cache.get(key)
+        if utm_coordinates is None:
+            Instrumentation.count('points.converted')
+            east, north, zone, zone_letter = utm.from_latlon(latitude, longitude)
+            east = self._float_type(east)
+            north = self._float_type(north)
+            north = north if (zone_letter >= 'N') else self._float_type(-1.0)*north
+            utm_coordinates = (east, north, zone)
+            self._conversion_cache.put(key, utm_coordinates)
+        return utm_coordinates
 
     def _utm_estimate_zone(self, east):
+        # Not cached, as the estimate is cheaper than a cache lookup
         earth_circumference = 40075017.0 # m
         if isinstance(east, list):
-            zone = []
-            for e in east:
-                zone.append(self._utm_estimate_zone(e))
-        else:
-            zone = np.ceil(earth_circumference/np.float64(east))-30 # subtract 30, beacuse the zones starts west of the US
-        return np.int(zone)
+            return [self._utm_estimate_zone(e) for e in east]
+        zone = np.ceil(earth_circumference/np.float64(east))-30 # subtract 30, beacuse the zones starts west of the US
+        return int(zone)
+
+    @staticmethod
+    def _batch_estimate_zone(east):
+        earth_circumference = 40075017.0 # m
+        zone = np.ceil(earth_circumference/np.asarray(east, dtype=np.float64))-30 # subtract 30, beacuse the zones starts west of the US
+        return zone.astype(int)
+
+    @staticmethod
+    @Instrumentation.timed('point.to_latlon')
+    def _batch_to_latlon(east, north, zone):
+        # Vectorized version of _to_latlon. utm.to_latlon only accepts a single zone per call, so the points are
+        # converted in one call per unique (zone, hemisphere) pair, which is normally just one call in total.
+        east = np.asarray(east, dtype=Point._float_type)
+        north = np.asarray(north, dtype=Point._float_type)
+        zone = np.broadcast_to(np.asarray(zone, dtype=int), east.shape)
+        northern = north > 0
+
+        latitude = np.empty(east.shape, dtype=Point._float_type)
+        longitude = np.empty(east.shape, dtype=Point._float_type)
+        Instrumentation.count('points.converted', east.size)
+        for this_zone, this_northern in set(zip(zone.tolist(), northern.tolist())):
+            mask = (zone == this_zone) & (northern == this_northern)
+            latitude[mask], longitude[mask] = utm.to_latlon(east[mask], np.abs(north[mask]), this_zone, northern=this_northern)
+        return latitude, longitude
+
+    @staticmethod
+    @Instrumentation.timed('point.to_utm')
+    def _batch_to_utm(latitude, longitude):
+        # Vectorized version of _to_utm. The zone number is determined per point using the same rules as
+        # utm.latlon_to_zone_number (including the exceptions around Norway and Svalbard).
+        latitude = np.asarray(latitude, dtype=Point._float_type)
+        longitude = np.asarray(longitude, dtype=Point._float_type)
+
+        lon = (longitude % 360 + 540) % 360 - 180
+        zone = ((lon + 180) / 6).astype(int) + 1
+        zone[(latitude >= 56) & (latitude < 64) & (lon >= 3) & (lon < 12)] = 32
+        svalbard = (latitude >= 72) & (latitude <= 84) & (lon >= 0)
+        zone[svalbard & (lon < 9)] = 31
+        zone[svalbard & (lon >= 9) & (lon < 21)] = 33
+        zone[svalbard & (lon >= 21) & (lon < 33)] = 35
+        zone[svalbard & (lon >= 33) & (lon < 42)] = 37
+        northern = latitude >= 0
+
+        east = np.empty(latitude.shape, dtype=Point._float_type)
+        north = np.empty(latitude.shape, dtype=Point._float_type)
+        Instrumentation.count('points.converted', latitude.size)
+        for this_zone, this_northern in set(zip(zone.tolist(), northern.tolist())):
+            mask = (zone == this_zone) & (northern == this_northern)
+            e, n, _, _ = utm.from_latlon(latitude[mask], longitude[mask], force_zone_number=this_zone, force_northern=this_northern)
+            east[mask] = e
+            north[mask] = n if this_northern else -1.0*n
+        return east, north, zone
+
+    @classmethod
+    def _from_values(cls, latitude, longitude, altitude, east, north, zone, source):
+        # Create a point from already converted coordinates without any further conversions
+        point = cls.__new__(cls)
+        point._set_values(latitude, longitude, altitude, east, north, zone, source)
+        return point
+
+    @classmethod
+    def from_arrays(cls, east, north, zone=None, altitude=None):
+        # Create a list of points from arrays of UTM coordinates, converting all of them to latitude-longitude at once.
+        #   zone        Either a single zone for all points, an array with a zone per point or None to estimate it from east.
+        #   altitude    Either an array with an altitude per point or None.
+        east = np.asarray(east, dtype=cls._float_type)
+        north = np.asarray(north, dtype=cls._float_type)
+        if (zone is None):
+            zone = cls._batch_estimate_zone(east)
+        zone = np.broadcast_to(np.asarray(zone, dtype=int), east.shape)
+        altitude = [None]*len(east) if altitude is None else np.asarray(altitude).tolist()
+
+        latitude, longitude = cls._batch_to_latlon(east, north, zone)
+
+        return [cls._from_values(lat, lon, alt, e, n, z, 'utm') for lat, lon, alt, e, n, z in zip(latitude, longitude, altitude, east, north, zone.tolist())]
+
+    @classmethod
+    def from_latlon_arrays(cls, latitude, longitude, altitude=None):
+        # Create a list of points from arrays of latitudes and longitudes, converting all of them to UTM at once.
+        #   altitude    Either an array with an altitude per point or None.
+        latitude = np.asarray(latitude, dtype=cls._float_type)
+        longitude = np.asarray(longitude, dtype=cls._float_type)
+        altitude = [None]*len(latitude) if altitude is None else np.asarray(altitude).tolist()
+
+        east, north, zone = cls._batch_to_utm(latitude, longitude)
+
+        return [cls._from_values(lat, lon, alt, e, n, z, 'latlon') for lat, lon, alt, e, n, z in zip(latitude, longitude, altitude, east, north, zone.tolist())]
 
     def distance(self, y, method=None):
         # Distance between self and point y
@@ -123,12 +334,15 @@ class Point(object):
         #       utm             Calculate the average using sum(points.utm)/len(points)
         # For more info, see: http://www.geomidpoint.com/calculation.html
 
-        if not isinstance(P,list) and not isinstance(P, Point):
-            TypeError('Expected P to be either a list or a Point.')
+        if not isinstance(P,list) and not isinstance(P, Point) and not isinstance(P, PointArray):
+            TypeError('Expected P to be either a list, a PointArray or a Point.')
 
-        if not isinstance(P,list):
+        if isinstance(P, Point):
             P = [P]
 
+        if not isinstance(P, PointArray):
+            P = PointArray.from_points(P)
+
         # if (self.latitude is not None):
         #     P = self + P
 
@@ -139,8 +353,8 @@ class Point(object):
             
         if (method == 'geographic'):
             # step 1: Convert to cartesian coordinates
-            latitudes  = np.asarray([p.latitude for p in P])*np.pi/180.0
-            longitudes = np.asarray([p.longitude for p in P])*np.pi/180.0
+            latitudes  = P.latitude*np.pi/180.0
+            longitudes = P.longitude*np.pi/180.0
 
             X = np.multiply(np.cos(latitudes), np.cos(longitudes))
             Y = np.multiply(np.cos(latitudes), np.sin(longitudes))
@@ -163,13 +377,175 @@ class Point(object):
         elif (method == 'average'):
             pass
         elif (method == 'utm'):
-            easts = np.asarray([p.east for p in P])
-            norths = np.asarray([p.north for p in P])
+            easts = P.east
+            norths = P.north
             east = np.mean(easts)
             north = np.mean(norths)
-            point_dict = {'east': east, 'north': north}
+            # Keep the zone of the points, if they share it. Otherwise, it is estimated from east.
+            zone = int(P.zone[0]) if np.all(P.zone == P.zone[0]) else None
+            point_dict = {'east': east, 'north': north, 'zone': zone}
         else:
             NotImplementedError('Unknown method (' + str(method) + ') for calculating midpoint.')
 
         return Point(**point_dict)
-# End of class Point
\ No newline at end of file
+# End of class Point
+
+
+class PointArray(object):
+    # Compact, columnar container of points.
+    # The coordinates are stored as contiguous floating point arrays (one row per coordinate: east, north, latitude, longitude, altitude) and the UTM zones as an int array.
+    # The floating point type is float64, unless another precision has been set with Point.set_precision.
+    # Indexing with an integer returns a lightweight Point view, while indexing with a slice, mask or index array returns a new PointArray.
+    # Missing altitudes are stored as NaN.
+    # The columns are read-only, so point arrays (and views of them) can be shared between plots without copying.
+
+    __slots__ = ('_coordinates', '_zone', '_source')
+
+    _EAST = 0
+    _NORTH = 1
+    _LATITUDE = 2
+    _LONGITUDE = 3
+    _ALTITUDE = 4
+
+    def __init__(self, east=None, north=None, latitude=None, longitude=None, altitude=None, zone=None, source=None):
+        # Create a point array from already converted coordinates. Use from_utm or from_latlon to convert coordinates.
+        east = np.asarray([] if east is None else east, dtype=Point._float_type)
+        n = east.shape[0]
+        coordinates = np.empty((5, n), dtype=Point._float_type)
+        coordinates[self._EAST] = east
+        coordinates[self._NORTH] = np.nan if north is None else north
+        coordinates[self._LATITUDE] = np.nan if latitude is None else latitude
+        coordinates[self._LONGITUDE] = np.nan if longitude is None else longitude
+        coordinates[self._ALTITUDE] = np.nan if altitude is None else np.asarray([np.nan if a is None else a for a in altitude] if isinstance(altitude, list) else altitude, dtype=Point._float_type)
+        zone = np.zeros(n, dtype=int) if zone is None else np.array(np.broadcast_to(np.asarray(zone, dtype=int), (n,)))
+        coordinates.flags.writeable = False
+        zone.flags.writeable = False
+        self._coordinates = coordinates
+        self._zone = zone
+        self._source = source
+
+    @classmethod
+    def from_columns(cls, coordinates, zone, source=None):
+        # Wrap existing column arrays without copying them.
+        #   coordinates     (5,n) array with the rows east, north, latitude, longitude and altitude
+        #   zone            (n,) int array
+        point_array = cls.__new__(cls)
+        point_array._coordinates = coordinates
+        point_array._zone = zone
+        point_array._source = source
+        return point_array
+
+    @classmethod
+    def from_utm(cls, east, north, zone=None, altitude=None):
+        # Create a point array from arrays of UTM coordinates, converting all of them to latitude-longitude at once.
+        #   zone        Either a single zone for all points, an array with a zone per point or None to estimate it from east.
+        east = np.asarray(east, dtype=Point._float_type)
+        north = np.asarray(north, dtype=Point._float_type)
+        if (zone is None):
+            zone = Point._batch_estimate_zone(east)
+        zone = np.broadcast_to(np.asarray(zone, dtype=int), east.shape)
+        latitude, longitude = Point._batch_to_latlon(east, north, zone)
+        return cls(east=east, north=north, latitude=latitude, longitude=longitude, altitude=altitude, zone=zone, source='utm')
+
+    @classmethod
+    def from_latlon(cls, latitude, longitude, altitude=None):
+        # Create a point array from arrays of latitudes and longitudes, converting all of them to UTM at once.
+        latitude = np.asarray(latitude, dtype=Point._float_type)
+        longitude = np.asarray(longitude, dtype=Point._float_type)
+        east, north, zone = Point._batch_to_utm(latitude, longitude)
+        return cls(east=east, north=north, latitude=latitude, longitude=longitude, altitude=altitude, zone=zone, source='latlon')
+
+    @classmethod
+    def from_points(cls, points):
+        # Create a point array from a list of Point objects
+        points = list(points)
+        sources = set(p._source for p in points)
+        source = sources.pop() if len(sources) == 1 else None
+        return cls(east=[p.east for p in points],
+                   north=[p.north for p in points],
+                   latitude=[p.latitude for p in points],
+                   longitude=[p.longitude for p in points],
+                   altitude=[p.altitude for p in points],
+                   zone=[p.zone for p in points],
+                   source=source)
+
+    @classmethod
+    def concatenate(cls, point_arrays):
+        # Join several point arrays into a single point array
+        point_arrays = list(point_arrays)
+        sources = set(p._source for p in point_arrays if len(p) > 0)
+        source = sources.pop() if len(sources) == 1 else None
+        coordinates = np.concatenate([p._coordinates for p in point_arrays], axis=1)
+        zone = np.concatenate([p._zone for p in point_arrays])
+        coordinates.flags.writeable = False
+        zone.flags.writeable = False
+        return cls.from_columns(coordinates, zone, source)
+
+    @property
+    def coordinates(self):
+        # (5,n) array with the rows east, north, latitude, longitude and altitude
+        return self._coordinates
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def east(self):
+        return self._coordinates[self._EAST]
+
+    @property
+    def north(self):
+        return self._coordinates[self._NORTH]
+
+    @property
+    def latitude(self):
+        return self._coordinates[self._LATITUDE]
+
+    @property
+    def longitude(self):
+        return self._coordinates[self._LONGITUDE]
+
+    @property
+    def altitude(self):
+        return self._coordinates[self._ALTITUDE]
+
+    @property
+    def zone(self):
+        return self._zone
+
+    def __len__(self):
+        return self._zone.shape[0]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            values = self._coordinates[:, idx]
+            # tolist converts float64 to python floats, which are faster to work with, but would truncate longdouble
+            east, north, latitude, longitude, altitude = values.tolist() if values.dtype == np.float64 else list(values)
+            altitude = None if np.isnan(altitude) else altitude
+            return Point._from_values(latitude, longitude, altitude, east, north, int(self._zone[idx]), self._source)
+        if isinstance(idx, slice):
+            # Views of the read-only columns are read-only as well
+            return PointArray.from_columns(self._coordinates[:, idx], self._zone[idx], self._source)
+        coordinates = self._coordinates[:, idx]
+        zone = self._zone[idx]
+        coordinates.flags.writeable = False
+        zone.flags.writeable = False
+        return PointArray.from_columns(coordinates, zone, self._source)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        str_out = ''
+        for p in self:
+            str_out += str(p)
+        return str_out
+# End of class PointArray
\ No newline at end of file
@@ -0,0 +1,266 @@
+# Drawing of plans, plots and fields with matplotlib.
+# The draw methods of Plan, Plot and Field import this module when they are called, so the model itself loads without matplotlib.
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba_array
+from Point import Point
+from Plot import Plot
+import Instrumentation
+
+
+@Instrumentation.timed('draw.plan')
+def draw_plan(plan, ax=None, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, show_field=True):
+    if (ax is None):
+        ax = plt.gca()
+
+    if (plan.field is not None and show_field):
+        draw_field(plan.field, ax=ax)
+
+    if (plan.plots is not None):
+        draw_plots(plan, ax=ax, show_ID=show_ID, show_plot=show_plot, show_AB_line=show_AB_line, show_AB=show_AB, show_end_points=show_end_points, hide_idle_plots=hide_idle_plots)
+
+    ax.axis('equal')
+    ax.set_xlabel('East, m')
+    ax.set_ylabel('North, m')
+
+    return ax
+
+
+@Instrumentation.timed('draw.plots')
+def draw_plots(plan, ax, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, hatch=True, end_point_markers=True, plot_indices=None):
+    # Draws all plots of the plan (or the plots in plot_indices) with one collection per layer instead of separate artists per plot. The appearance matches draw_plot.
+    # Idle (non-work or ignored) plots are drawn with reduced alpha using per-item colors.
+    # With hatch=False and end_point_markers=False, the plots are drawn without hatching and the end points without markers, which renders considerably faster.
+    # Returns a dictionary with the artists of each layer: plots, ab_lines, AB, end_points, end_point_markers and ID.
+    # The entry plot_index maps each plot index to its item in the layers, which is used by restyle_plots.
+    artists = {}
+
+    if plot_indices is None:
+        plot_indices = range(len(plan.plots))
+    plot_indices = list(plot_indices)
+    idle_alpha = np.ones(len(plan.plots))
+    idle_alpha[plot_indices] = _idle_alpha([plan.plots[i] for i in plot_indices], hide_idle_plots)
+
+    with_corners = [i for i in plot_indices if plan.plots[i]._has_geometry('corners')]
+    with_ab_line = [i for i in plot_indices if plan.plots[i]._has_geometry('ab_line')]
+    with_end_points = [i for i in plot_indices if plan.plots[i]._has_geometry('end_points')]
+    labelled = [i for i in plot_indices if plan.plots[i].ID is not None and (plan.plots[i]._has_geometry('corners') or plan.plots[i]._has_geometry('end_points'))]
+    artists['plot_index'] = {'plots': {i: item for item, i in enumerate(with_corners)},
+                             'ab_lines': {i: item for item, i in enumerate(with_ab_line)},
+                             'AB': {i: item for item, i in enumerate(with_ab_line)},
+                             'end_points': {i: item for item, i in enumerate(with_end_points)},
+                             'end_point_markers': {i: item for item, i in enumerate(with_end_points)},
+                             'ID': {i: item for item, i in enumerate(labelled)}}
+
+    if with_corners and show_plot:
+        corners = Plot._gather([plan.plots[i] for i in with_corners], 'corners')
+        polygons = np.stack([corners.east, corners.north], axis=1).reshape(len(with_corners), -1, 2)
+        # Like ax.fill, each plot gets the next color of the color cycle
+        cycle_colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+        facecolors = to_rgba_array([cycle_colors[i % len(cycle_colors)] for i in range(len(with_corners))])
+        facecolors[:, 3] = 0.3*idle_alpha[with_corners]
+        edgecolors = np.zeros((len(with_corners), 4))
+        edgecolors[:, 3] = 0.3*idle_alpha[with_corners]
+        artists['plots'] = ax.add_collection(PolyCollection(polygons, facecolors=facecolors, edgecolors=edgecolors, hatch='///' if hatch else None))
+
+    if with_ab_line and show_AB_line:
+        segments = _ab_line_segments(plan, with_ab_line)
+        colors = to_rgba_array(['grey']*len(with_ab_line))
+        colors[:, 3] = idle_alpha[with_ab_line]
+        artists['ab_lines'] = ax.add_collection(LineCollection(segments, colors=colors, linewidths=2, linestyles='solid'))
+        if show_AB:
+            artists['AB'] = _draw_AB(ax, segments, idle_alpha[with_ab_line])
+
+    if with_end_points and show_end_points:
+        segments = _end_point_segments(plan, with_end_points)
+        colors = np.zeros((len(with_end_points), 4))
+        colors[:, 3] = idle_alpha[with_end_points]
+        artists['end_points'] = ax.add_collection(LineCollection(segments, colors=colors, linewidths=1, linestyles='dashed'))
+        if end_point_markers:
+            artists['end_point_markers'] = _draw_end_point_markers(ax, segments, idle_alpha[with_end_points])
+
+    if show_ID:
+        artists['ID'] = []
+        for i in labelled:
+            plot = plan.plots[i]
+            points = plot.corners if plot._has_geometry('corners') else plot.end_points
+            artists['ID'].append(ax.text(np.mean(points.east), np.mean(points.north), str(plot.ID), horizontalalignment='center', verticalalignment='center', alpha=idle_alpha[i]))
+
+    ax.autoscale_view()
+
+    Instrumentation.count('artists.created', _count_artists(artists))
+    return artists
+
+
+@Instrumentation.timed('draw.details')
+def draw_plot_details(plan, ax, plot_indices, show_ID=True, show_hatch=True, show_AB=True, show_end_point_markers=True, hide_idle_plots=True):
+    # Draws the details, which draw_plots(..., show_ID=False, show_AB=False, hatch=False, end_point_markers=False) leaves out, for the plots in plot_indices:
+    # hatching (as a separate, unfilled layer on top of the plots), A/B labels, end point markers and IDs. Used to show full detail only for the plots in view.
+    # Returns a dictionary like draw_plots with the layers hatch, AB, end_point_markers and ID.
+    artists = draw_plots(plan, ax, show_ID=show_ID, show_plot=False, show_AB_line=False, show_end_points=False, hide_idle_plots=hide_idle_plots, plot_indices=plot_indices)
+
+    with_ab_line = [i for i in plot_indices if plan.plots[i]._has_geometry('ab_line')]
+    if with_ab_line and show_AB:
+        artists['AB'] = _draw_AB(ax, _ab_line_segments(plan, with_ab_line), _idle_alpha([plan.plots[i] for i in with_ab_line], hide_idle_plots))
+
+    with_end_points = [i for i in plot_indices if plan.plots[i]._has_geometry('end_points')]
+    if with_end_points and show_end_point_markers:
+        artists['end_point_markers'] = _draw_end_point_markers(ax, _end_point_segments(plan, with_end_points), _idle_alpha([plan.plots[i] for i in with_end_points], hide_idle_plots))
+
+    # Only part of the plan is in view, so labels of plots at the edge of the view must not be drawn outside the axes
+    for text in artists.get('ID', []) + artists.get('AB', []):
+        text.set_clip_on(True)
+
+    with_corners = [i for i in plot_indices if plan.plots[i]._has_geometry('corners')]
+    artists['plot_index']['hatch'] = {i: item for item, i in enumerate(with_corners)}
+    if with_corners and show_hatch:
+        idle_alpha = _idle_alpha([plan.plots[i] for i in with_corners], hide_idle_plots)
+        corners = Plot._gather([plan.plots[i] for i in with_corners], 'corners')
+        polygons = np.stack([corners.east, corners.north], axis=1).reshape(len(with_corners), -1, 2)
+        # The hatch is drawn with the edge color. The edges themselves are already drawn by the plots layer.
+        edgecolors = np.zeros((len(with_corners), 4))
+        edgecolors[:, 3] = 0.3*idle_alpha
+        artists['hatch'] = ax.add_collection(PolyCollection(polygons, facecolors='none', edgecolors=edgecolors, linewidths=0, hatch='///'), autolim=False)
+
+    # The ID layer has been counted by draw_plots
+    Instrumentation.count('artists.created', _count_artists({layer: artists[layer] for layer in ['AB', 'end_point_markers', 'hatch'] if layer in artists}))
+    return artists
+
+
+@Instrumentation.timed('draw.restyle')
+def restyle_plots(plan, artists, plot_indices=None, hide_idle_plots=True):
+    # Updates the alpha of the given plots (default: all) in artists returned by draw_plots or draw_plot_details, e.g. after changing work or ignored.
+    # Only the colors of the affected items are changed. Nothing is redrawn until the canvas is.
+    if plot_indices is None:
+        plot_indices = range(len(plan.plots))
+    plot_indices = list(plot_indices)
+    idle_alpha = _idle_alpha([plan.plots[i] for i in plot_indices], hide_idle_plots)
+    plot_index = artists['plot_index']
+
+    def items_and_alpha(layer):
+        items_alpha = [(plot_index[layer][i], alpha) for i, alpha in zip(plot_indices, idle_alpha.tolist()) if i in plot_index[layer]]
+        items = np.asarray([item for item, _ in items_alpha], dtype=int)
+        alpha = np.asarray([alpha for _, alpha in items_alpha])
+        return items, alpha
+
+    if 'plots' in artists:
+        items, alpha = items_and_alpha('plots')
+        facecolors = artists['plots'].get_facecolor().copy()
+        edgecolors = artists['plots'].get_edgecolor().copy()
+        facecolors[items, 3] = 0.3*alpha
+        edgecolors[items, 3] = 0.3*alpha
+        artists['plots'].set_facecolor(facecolors)
+        artists['plots'].set_edgecolor(edgecolors)
+
+    if 'hatch' in artists:
+        items, alpha = items_and_alpha('hatch')
+        edgecolors = artists['hatch'].get_edgecolor().copy()
+        edgecolors[items, 3] = 0.3*alpha
+        artists['hatch'].set_edgecolor(edgecolors)
+
+    if 'ab_lines' in artists:
+        items, alpha = items_and_alpha('ab_lines')
+        colors = artists['ab_lines'].get_color().copy()
+        colors[items, 3] = alpha
+        artists['ab_lines'].set_color(colors)
+
+    if 'AB' in artists:
+        items, alpha = items_and_alpha('AB')
+        for item, a in zip(items.tolist(), alpha.tolist()):
+            artists['AB'][2*item].set_alpha(a)
+            artists['AB'][2*item + 1].set_alpha(a)
+
+    if 'end_points' in artists:
+        items, alpha = items_and_alpha('end_points')
+        colors = artists['end_points'].get_color().copy()
+        colors[items, 3] = alpha
+        artists['end_points'].set_color(colors)
+
+    if 'end_point_markers' in artists:
+        items, alpha = items_and_alpha('end_point_markers')
+        # Each end point segment has a marker per end point
+        n_markers = len(artists['end_point_markers'].get_offsets())//max(len(plot_index['end_point_markers']), 1)
+        markers = artists['end_point_markers'].get_facecolor().copy()
+        markers[(n_markers*items[:, np.newaxis] + np.arange(n_markers)).ravel(), 3] = np.repeat(alpha, n_markers)
+        artists['end_point_markers'].set_facecolor(markers)
+
+    if 'ID' in artists:
+        items, alpha = items_and_alpha('ID')
+        for item, a in zip(items.tolist(), alpha.tolist()):
+            artists['ID'][item].set_alpha(a)
+
+
+def draw_plot(plot, ax, show_ID=True, show_plot=True, show_AB_line=True, show_AB=True, show_end_points=True, hide_idle_plots=True, idle_alpha=0.3):
+
+    if (plot.corners is not None) and (show_plot):
+        east = plot.corners.east
+        north = plot.corners.north
+        ax.fill(east, north, edgecolor=[0,0,0],hatch='///', alpha=0.3*idle_alpha)
+
+    if (plot.ab_line is not None) and (show_AB_line):
+        east = plot.ab_line.east
+        north = plot.ab_line.north
+        ax.plot(east, north, marker='', linestyle='solid', color='grey', linewidth=2, alpha=idle_alpha)
+        if show_AB:
+            ax.text(east[0], north[0], 'A', horizontalalignment='center', verticalalignment='center', alpha=idle_alpha)
+            ax.text(east[1], north[1], 'B', horizontalalignment='center', verticalalignment='center', alpha=idle_alpha)
+
+    if (plot.end_points is not None) and (show_end_points):
+        east = plot.end_points.east
+        north = plot.end_points.north
+        ax.plot(east, north, marker='.', linestyle='dashed', color='black', linewidth=1, alpha=idle_alpha)
+
+    if (show_ID and plot.ID is not None):
+        if (plot.corners is not None):
+            point = Point.midpoint(plot.corners)
+        else:
+            point = Point.midpoint(plot.end_points)
+        ax.text(point.east, point.north, str(plot.ID), horizontalalignment='center', verticalalignment='center', alpha=idle_alpha, picker=100)
+
+
+@Instrumentation.timed('draw.field')
+def draw_field(field, ax):
+    east = field.points.east
+    north = field.points.north
+    # Returns the artists of the field
+    polygons = ax.fill(east, north, edgecolor=[0,0,0], facecolor=[0.5, 0.5, 0.5], fill=False)
+    vertices = ax.scatter(east, north, color=[0,0,0], marker='.', edgecolors='face')
+    Instrumentation.count('artists.created', len(polygons) + 1)
+    return polygons + [vertices]
+
+
+def _count_artists(artists):
+    # Number of matplotlib artists in the layers of a dictionary returned by draw_plots. A collection counts as one artist.
+    return sum(len(layer) if isinstance(layer, list) else 1 for name, layer in artists.items() if name != 'plot_index')
+
+
+def _ab_line_segments(plan, plot_indices):
+    # (N,2,2) array with the east and north coordinates of A and B of the given plots
+    ab_lines = Plot._gather([plan.plots[i] for i in plot_indices], 'ab_line')
+    return np.stack([ab_lines.east, ab_lines.north], axis=1).reshape(len(plot_indices), 2, 2)
+
+
+def _end_point_segments(plan, plot_indices):
+    # (N,K,2) array with the east and north coordinates of the K end points of the given plots
+    end_points = Plot._gather([plan.plots[i] for i in plot_indices], 'end_points')
+    return np.stack([end_points.east, end_points.north], axis=1).reshape(len(plot_indices), -1, 2)
+
+
+def _draw_end_point_markers(ax, segments, alpha):
+    # Marks each end point with a black dot with the alpha of its plot
+    colors = np.zeros((segments.shape[0]*segments.shape[1], 4))
+    colors[:, 3] = np.repeat(alpha, segments.shape[1])
+    return ax.scatter(segments[:, :, 0].ravel(), segments[:, :, 1].ravel(), s=plt.rcParams['lines.markersize']**2, c=colors, marker='.', edgecolors='face')
+
+
+def _draw_AB(ax, segments, alpha):
+    # Labels the A and B end of each AB-line segment. Returns the texts in the order A, B of the first segment, A, B of the second segment, etc.
+    return [ax.text(segment[k][0], segment[k][1], label, horizontalalignment='center', verticalalignment='center', alpha=a)
+            for segment, a in zip(np.asarray(segments).tolist(), np.asarray(alpha).tolist())
+            for k, label in enumerate(['A', 'B'])]
+
+
+def _idle_alpha(plots, hide_idle_plots=True):
+    # Alpha of each plot. Idle (non-work or ignored) plots are faded, if hide_idle_plots is True.
+    return np.asarray([0.3 if (hide_idle_plots and (not plot.work or plot.ignored)) else 1.0 for plot in plots])
@@ -0,0 +1,122 @@
+import numpy as np
+import Instrumentation
+
+class SpatialIndex(object):
+    # Uniform grid index over the bounding boxes of polygons (e.g. plots).
+    # Each polygon is registered in every grid cell its bounding box overlaps. The cells are stored in compressed form (sorted cell ids with
+    # the polygon of each entry), so a point query only looks at the polygons of a single cell, regardless of the number of polygons.
+    #   polygons    (N,K,2) array with the K east and north coordinates of each polygon
+
+    polygons = None
+    bboxes = None
+    cell_size = None
+
+    _origin = None
+    _n_cells = None
+    _cell_ids = None
+    _cell_polygons = None
+
+    @Instrumentation.timed('spatial_index.build')
+    def __init__(self, polygons, cell_size=None):
+        polygons = np.asarray(polygons, dtype=np.float64).reshape(len(polygons), -1, 2)
+        self.polygons = polygons
+
+        # Bounding boxes as (N,4) array: min east, min north, max east, max north
+        self.bboxes = np.concatenate([polygons.min(axis=1), polygons.max(axis=1)], axis=1) if len(polygons) > 0 else np.empty((0, 4))
+
+        if (cell_size is None):
+            # Cells about the size of a typical polygon keep the number of cells per polygon and polygons per cell low
+            extent = np.max(self.bboxes[:, 2:] - self.bboxes[:, :2], axis=1) if len(polygons) > 0 else np.ones(1)
+            cell_size = float(np.median(extent))
+        self.cell_size = max(cell_size, 1e-3)
+
+        self._origin = self.bboxes[:, :2].min(axis=0) if len(polygons) > 0 else np.zeros(2)
+        first_cell = self._cell_xy(self.bboxes[:, :2])
+        last_cell = self._cell_xy(self.bboxes[:, 2:])
+        self._n_cells = (last_cell.max(axis=0) + 1) if len(polygons) > 0 else np.ones(2, dtype=np.int64)
+
+        # Enumerate all (cell, polygon) pairs without a python loop over the polygons
+        span = last_cell - first_cell + 1
+        n_pairs = span[:, 0]*span[:, 1]
+        polygon_idx = np.repeat(np.arange(len(polygons)), n_pairs)
+        pair_offset = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        cell_x = first_cell[polygon_idx, 0] + pair_offset % span[polygon_idx, 0]
+        cell_y = first_cell[polygon_idx, 1] + pair_offset // span[polygon_idx, 0]
+
+        cell_ids = cell_y*self._n_cells[0] + cell_x
+        order = np.argsort(cell_ids, kind='stable')
+        self._cell_ids = cell_ids[order]
+        self._cell_polygons = polygon_idx[order]
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def _cell_xy(self, xy):
+        return np.floor((np.asarray(xy, dtype=np.float64) - self._origin)/self.cell_size).astype(np.int64)
+
+    def _candidates_in_cells(self, first_cell, last_cell):
+        # Indices of the polygons registered in the cells from first_cell to last_cell (both included)
+        first_cell = np.maximum(first_cell, 0)
+        last_cell = np.minimum(last_cell, self._n_cells - 1)
+        if np.any(last_cell < first_cell):
+            return np.empty(0, dtype=np.int64)
+
+        # Each row of cells is a contiguous range of cell ids
+        rows = np.arange(first_cell[1], last_cell[1] + 1)
+        starts = np.searchsorted(self._cell_ids, rows*self._n_cells[0] + first_cell[0], side='left')
+        ends = np.searchsorted(self._cell_ids, rows*self._n_cells[0] + last_cell[0], side='right')
+        return np.unique(np.concatenate([self._cell_polygons[start:end] for start, end in zip(starts, ends)] + [np.empty(0, dtype=np.int64)]))
+
+    def query_point(self, east, north):
+        # Returns the indices of the polygons containing the point (east, north)
+        cell = self._cell_xy([east, north])
+        candidates = self._candidates_in_cells(cell, cell)
+        inside = self.points_in_polygons(np.full(len(candidates), east), np.full(len(candidates), north), self.polygons[candidates])
+        return candidates[inside]
+
+    def query_bbox(self, min_east, min_north, max_east, max_north):
+        # Returns the indices of the polygons whose bounding box overlaps the given bounding box
+        first_cell = self._cell_xy([min_east, min_north])
+        last_cell = self._cell_xy([max_east, max_north])
+        n_query_cells = np.prod(np.maximum(np.minimum(last_cell, self._n_cells - 1) - np.maximum(first_cell, 0) + 1, 0))
+        if (n_query_cells > len(self)):
+            # For large areas, testing all bounding boxes at once is cheaper than collecting the cells
+            candidates = np.arange(len(self))
+        else:
+            candidates = self._candidates_in_cells(first_cell, last_cell)
+        bboxes = self.bboxes[candidates]
+        overlaps = (bboxes[:, 0] <= max_east) & (bboxes[:, 2] >= min_east) & (bboxes[:, 1] <= max_north) & (bboxes[:, 3] >= min_north)
+        return candidates[overlaps]
+
+    def query_polygon(self, polygon):
+        # Returns the indices of the polygons whose center (mean of its vertices) lies inside polygon
+        #   polygon     (M,2) array of east and north coordinates
+        polygon = np.asarray(polygon, dtype=np.float64)
+        candidates = self.query_bbox(*polygon.min(axis=0), *polygon.max(axis=0))
+        centers = self.polygons[candidates].mean(axis=1)
+        inside = self.points_in_polygon(centers[:, 0], centers[:, 1], polygon[:, 0], polygon[:, 1])
+        return candidates[inside]
+
+    @staticmethod
+    def points_in_polygon(x, y, polygon_x, polygon_y):
+        # Even-odd test of the points (x, y) against a single polygon. Returns a boolean array.
+        polygon = np.stack([np.asarray(polygon_x, dtype=np.float64), np.asarray(polygon_y, dtype=np.float64)], axis=1)
+        return SpatialIndex.points_in_polygons(x, y, polygon[np.newaxis, :, :])
+
+    @staticmethod
+    def points_in_polygons(x, y, polygons):
+        # Even-odd test of point i against polygon i. Returns a boolean array.
+        #   polygons    (N,K,2) array, or (1,K,2) to test all points against the same polygon
+        x = np.asarray(x, dtype=np.float64)[:, np.newaxis]
+        y = np.asarray(y, dtype=np.float64)[:, np.newaxis]
+        x0 = polygons[:, :, 0]
+        y0 = polygons[:, :, 1]
+        x1 = np.roll(x0, -1, axis=1)
+        y1 = np.roll(y0, -1, axis=1)
+        # An edge is crossed by a ray going east from the point, if it straddles the point's north coordinate and lies east of it
+        straddles = (y0 > y) != (y1 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_crossing = x0 + (y - y0)*(x1 - x0)/(y1 - y0)
+        crossings = straddles & (x < x_crossing)
+        return (np.count_nonzero(crossings, axis=1) % 2) == 1
+# End of class SpatialIndex
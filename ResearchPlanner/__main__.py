@@ -0,0 +1,11 @@
+# Entry point of "python -m ResearchPlanner". Runs the headless command line interface, see CLI.py.
+import os
+import sys
+
+# The modules of Research Planner import each other by their module names
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import CLI
+
+if __name__ == '__main__':
+    sys.exit(CLI.main())
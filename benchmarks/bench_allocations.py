@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Counts the memory allocations made while importing a plot layout and while constructing plots one at a time.
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import common
+import synthetic
+
+
+def count_allocations(func):
+    # Returns the number of memory blocks allocated by func() and still alive afterwards, the peak traced memory (bytes) and the wall time (s)
+    gc.collect()
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    result = func()
+    wall_time = time.perf_counter() - start
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename') if stat.count_diff > 0)
+    del result
+    return blocks, peak, wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_source_argument(parser)
+    parser.add_argument('--plots', type=int, default=2000, help='Number of plots in the synthetic layout')
+    args = parser.parse_args()
+
+    common.use_source(args)
+    from Plan import Plan
+    from Plot import Plot
+
+    corners = synthetic.plot_grid_corners(args.plots)
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'plots.csv')
+        synthetic.write_plot_csv(filename, corners)
+
+        plan = Plan()
+        blocks, peak, wall_time = count_allocations(lambda: plan.read_plot_csv(filename, is_utm=True, utm_zone=synthetic.ZONE))
+        print('read_plot_csv     : {:10d} blocks ({:8.1f} per plot), peak {:8.2f} MB, {:7.3f} s (with tracing)'.format(blocks, blocks/args.plots, peak/1e6, wall_time))
+
+        blocks, peak, wall_time = count_allocations(lambda: [Plot(corners=list(plot.corners), ID=plot.ID) for plot in plan.plots])
+        print('Plot(corners=...) : {:10d} blocks ({:8.1f} per plot), peak {:8.2f} MB, {:7.3f} s (with tracing)'.format(blocks, blocks/args.plots, peak/1e6, wall_time))
+
+
+if __name__ == '__main__':
+    main()
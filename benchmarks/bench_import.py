@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# Measures the time of importing the model modules in a fresh interpreter, and checks that they do not import matplotlib or Qt.
+# numpy is imported first and timed separately, since every module depends on it.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import common
+
+# Run in the child interpreter. Prints the import times (s) and the GUI/plotting packages, which were loaded, as json.
+CHILD_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import numpy
+numpy_time = time.perf_counter() - start
+start = time.perf_counter()
+import {module}
+module_time = time.perf_counter() - start
+heavy = sorted(set(name.split('.')[0] for name in sys.modules) & {{'matplotlib', 'PyQt5'}})
+print(json.dumps({{'numpy': numpy_time, 'module': module_time, 'heavy': heavy}}))
+'''
+
+
+def time_import(source, module, env):
+    output = subprocess.run([sys.executable, '-c', CHILD_CODE.format(module=module)], cwd=source, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_source_argument(parser)
+    parser.add_argument('--modules', nargs='+', default=['Point', 'Plot', 'Field', 'Plan', 'CLI'], help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=7, help='Number of fresh interpreters per module. The median is reported.')
+    args = parser.parse_args()
+    source = os.path.abspath(args.source)
+
+    with tempfile.TemporaryDirectory() as cache_folder:
+        # Compiled bytecode is kept outside the source folder. The first import of each module compiles it and is not counted.
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache_folder)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        for module in args.modules:
+            if not os.path.exists(os.path.join(source, module + '.py')):
+                print('{:10s}: not found in {}'.format(module, source))
+                continue
+            time_import(source, module, env)
+            results = [time_import(source, module, env) for _ in range(args.repeat)]
+            module_time = statistics.median(result['module'] for result in results)
+            numpy_time = statistics.median(result['numpy'] for result in results)
+            print('{:10s}: {:7.1f} ms after numpy ({:6.1f} ms for numpy), imports matplotlib/Qt: {}'.format(module, module_time*1e3, numpy_time*1e3, ', '.join(results[0]['heavy']) or 'no'))
+
+
+if __name__ == '__main__':
+    main()
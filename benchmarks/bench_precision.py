@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# Accuracy and speed of the coordinate precisions supported by Point.set_precision.
+#
+# The accuracy check converts a grid of UTM coordinates covering a field of --field-size metres to latitude-longitude and back,
+# both for single points and for point arrays, and reports the largest round-trip error. The script exits with status 1,
+# if the error of any precision exceeds --tolerance (default 1 mm), so it can be used to verify the float64 default.
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import common
+import synthetic
+
+
+def round_trip_error(Point, PointArray, east, north, zone, n_single):
+    # Largest distance (m) between the original UTM coordinates and the coordinates after a UTM -> latitude-longitude -> UTM round-trip
+    latlon = PointArray.from_utm(east=east, north=north, zone=zone)
+    utm = PointArray.from_latlon(latitude=latlon.latitude, longitude=latlon.longitude)
+    array_error = np.max(np.hypot(utm.east - east, utm.north - north))
+
+    single_error = 0.0
+    for e, n in zip(east[:n_single], north[:n_single]):
+        point = Point(latitude=Point(east=e, north=n, zone=zone).latitude, longitude=Point(east=e, north=n, zone=zone).longitude)
+        single_error = max(single_error, float(np.hypot(point.east - e, point.north - n)))
+
+    return float(array_error), single_error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_source_argument(parser)
+    parser.add_argument('--field-size', type=float, default=5000.0, help='Side length (m) of the square area tested')
+    parser.add_argument('--grid', type=int, default=500, help='Number of grid points along each side')
+    parser.add_argument('--tolerance', type=float, default=0.001, help='Largest accepted round-trip error (m)')
+    parser.add_argument('--plots', type=int, default=20000, help='Number of plots for the timing of Plot.batch_from_corners')
+    args = parser.parse_args()
+
+    common.use_source(args)
+    from Point import Point, PointArray
+    from Plot import Plot
+
+    offsets = np.linspace(0.0, args.field_size, args.grid)
+    east, north = np.meshgrid(synthetic.ORIGIN_EAST + offsets, synthetic.ORIGIN_NORTH + offsets)
+    east, north = east.ravel(), north.ravel()
+    corners = synthetic.plot_grid_corners(args.plots)
+    ids = [str(i) for i in range(args.plots)]
+
+    failed = False
+    for precision in ['float64', 'longdouble']:
+        Point.set_precision(precision)
+        array_error, single_error = round_trip_error(Point, PointArray, east.astype(Point.get_precision()), north.astype(Point.get_precision()), synthetic.ZONE, n_single=1000)
+
+        start = time.perf_counter()
+        Plot.batch_from_corners(corners, ids, zone=synthetic.ZONE)
+        batch_time = time.perf_counter() - start
+
+        failed = failed or max(array_error, single_error) > args.tolerance
+        print('{:10s}: round-trip error {:.3e} m (arrays), {:.3e} m (single points), Plot.batch_from_corners({:d}) {:.3f} s'.format(precision, array_error, single_error, args.plots, batch_time))
+
+    Point.set_precision('float64')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
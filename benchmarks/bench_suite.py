@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# Benchmark suite of importing, constructing, exporting and drawing synthetic plot layouts and fields of 1k to 1M corners.
+# Each case is timed --repeat times (minimum and median wall time are reported) and run once more with tracemalloc for the peak memory,
+# which includes the numpy arrays. The results are written as json with --output, and compared to an earlier run with --compare, e.g.
+#
+#   python benchmarks/bench_suite.py --output before.json                  (on the old commit)
+#   python benchmarks/bench_suite.py --output after.json --compare before.json
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import common
+import synthetic
+
+CASES = ['read_plot_csv', 'read_field_csv', 'construct_plots', 'construct_plots_single', 'export_plots', 'export_field', 'draw', 'draw_overview']
+
+
+def measure(func, setup, repeat):
+    # Returns the wall times (s) of repeat calls of func(setup()) and the peak traced memory (bytes) of one more call.
+    # setup is not timed, and its result is released before the next call.
+    wall_times = []
+    for _ in range(repeat):
+        state = setup()
+        gc.collect()
+        start = time.perf_counter()
+        func(state)
+        wall_times.append(time.perf_counter() - start)
+        del state
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    func(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return wall_times, peak
+
+
+def git_commit(source):
+    # Commit of the checkout with the source, or None
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=source, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_cases(folder, n_corners, slow_limit):
+    # Returns a dictionary with the (setup, func) pair of each case for a layout of n_corners plot corners and a field of n_corners points
+    from Plan import Plan
+    from Plot import Plot
+    from Point import Point
+
+    n_plots = max(n_corners//4, 1)
+    corners = synthetic.plot_grid_corners(n_plots)
+    boundary = synthetic.field_boundary(corners, n_corners)
+    ids = ['plot_' + str(i) for i in range(n_plots)]
+    plots_csv = os.path.join(folder, 'plots_' + str(n_corners) + '.csv')
+    field_csv = os.path.join(folder, 'field_' + str(n_corners) + '.csv')
+    synthetic.write_plot_csv(plots_csv, corners)
+    synthetic.write_field_csv(field_csv, boundary)
+
+    def read_plan():
+        plan = Plan()
+        plan.read_plot_csv(plots_csv, is_utm=True, utm_zone=synthetic.ZONE)
+        plan.read_field_csv(field_csv, is_utm=True, utm_zone=synthetic.ZONE)
+        return plan
+
+    def construct_single(_):
+        for this_id, these_corners in zip(ids, corners):
+            Plot(ID=this_id, corners=[Point(east=east, north=north, zone=synthetic.ZONE) for east, north in these_corners])
+
+    def draw(plan, overview=False):
+        # Draws the plan on an offscreen (Agg) figure, including rendering it.
+        # The overview is drawn like the zoomed out view of the GUI: without labels, hatching and end point markers.
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=(10, 10))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot(1, 1, 1)
+        if overview:
+            plan.field.draw(ax)
+            plan.draw_plots(ax, show_ID=False, show_AB=False, hatch=False, end_point_markers=False)
+        else:
+            plan.draw(ax=ax)
+        figure.canvas.draw()
+
+    cases = {'read_plot_csv': (Plan, lambda plan: plan.read_plot_csv(plots_csv, is_utm=True, utm_zone=synthetic.ZONE)),
+             'read_field_csv': (Plan, lambda plan: plan.read_field_csv(field_csv, is_utm=True, utm_zone=synthetic.ZONE)),
+             'construct_plots': (lambda: None, lambda _: Plot.batch_from_corners(corners, ids, zone=synthetic.ZONE)),
+             'export_plots': (read_plan, lambda plan: plan.export_plots(os.path.join(folder, 'plots.json'))),
+             'export_field': (read_plan, lambda plan: plan.export_field(os.path.join(folder, 'field.json'))),
+             'draw_overview': (read_plan, lambda plan: draw(plan, overview=True))}
+    # Constructing the plots one at a time and drawing every plot with labels and hatching (Plan.draw) are far slower than the other cases, so they are only run for the smaller layouts
+    if (n_corners <= slow_limit):
+        cases['construct_plots_single'] = (lambda: None, construct_single)
+        cases['draw'] = (read_plan, draw)
+    return cases
+
+
+def compare(results, baseline):
+    # Prints the ratio of the minimum wall time and of the peak memory of each case to the same case in baseline
+    baseline_results = {(result['case'], result['corners']): result for result in baseline['results']}
+    print('\nCompared to {} ({}):'.format(baseline.get('commit') or 'baseline', baseline.get('date', '')))
+    for result in results:
+        old = baseline_results.get((result['case'], result['corners']))
+        if (old is None):
+            continue
+        print('{:24s} {:>9d} corners: time {:6.2f}x, memory {:6.2f}x'.format(result['case'], result['corners'], result['wall_time_min']/old['wall_time_min'], result['peak_memory']/max(old['peak_memory'], 1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    common.add_source_argument(parser)
+    parser.add_argument('--corners', type=int, nargs='+', default=[1000, 10000, 100000, 1000000], help='Number of plot corners (4 per plot) and field points of each layout')
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES, help='Cases to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each case')
+    parser.add_argument('--slow-limit', type=int, default=10000, help='Largest number of corners, for which construct_plots_single and draw are run')
+    parser.add_argument('--output', default=None, help='json-file to write the results to')
+    parser.add_argument('--compare', default=None, help='json-file of an earlier run to compare to')
+    args = parser.parse_args()
+    source = common.use_source(args)
+
+    import matplotlib
+    matplotlib.use('Agg')
+
+    run = {'commit': git_commit(source),
+           'date': datetime.datetime.now().isoformat(timespec='seconds'),
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'machine': platform.machine(),
+           'repeat': args.repeat,
+           'results': []}
+
+    with tempfile.TemporaryDirectory() as folder:
+        for n_corners in args.corners:
+            cases = build_cases(folder, n_corners, args.slow_limit)
+            for case in args.cases:
+                if case not in cases:
+                    continue
+                setup, func = cases[case]
+                wall_times, peak = measure(func, setup, args.repeat)
+                result = {'case': case, 'corners': n_corners, 'plots': max(n_corners//4, 1),
+                          'wall_time_min': min(wall_times), 'wall_time_median': statistics.median(wall_times), 'wall_times': wall_times, 'peak_memory': peak}
+                run['results'].append(result)
+                print('{:24s} {:>9d} corners: {:9.4f} s (median {:9.4f} s), peak {:9.2f} MB'.format(case, n_corners, result['wall_time_min'], result['wall_time_median'], peak/1e6), flush=True)
+
+    if (args.output is not None):
+        with open(args.output, 'w') as json_file:
+            json.dump(run, json_file, indent=2)
+
+    if (args.compare is not None):
+        with open(args.compare) as json_file:
+            compare(run['results'], json.load(json_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+# Command line setup shared by the benchmarks.
+# Every benchmark takes --source, the folder with the modules to measure, so it can be run against another checkout
+# (e.g. a git worktree of an older commit) to compare before and after without switching branches.
+import os
+import sys
+
+
+def add_source_argument(parser):
+    # Adds --source to an argparse parser. The default is the ResearchPlanner folder of this checkout.
+    parser.add_argument('--source', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ResearchPlanner'), help='Folder with Plan.py, Plot.py and Point.py')
+
+
+def use_source(args):
+    # Puts the --source folder first on the module search path, so the benchmark imports the modules from it. Returns the absolute path of the folder.
+    source = os.path.abspath(args.source)
+    sys.path.insert(0, source)
+    return source
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# Generators for synthetic plot layouts and field boundaries used by the benchmarks.
+# The csv-files use the same format as the GUI imports: north, east, altitude, id (UTM, no header).
+import csv
+import numpy as np
+
+ORIGIN_EAST = 550000.0 # m, zone 32 (Denmark)
+ORIGIN_NORTH = 6230000.0 # m
+ZONE = 32
+
+
+def plot_grid_corners(n_plots, plot_length=10.0, plot_width=1.5, gap_length=2.0, gap_width=1.5, angle=0.3, seed=0):
+    # Returns a (n_plots,4,2) array of east and north coordinates of a rotated, rectangular grid of plots.
+    # The corners of each plot are shuffled, like they are in surveyed layouts.
+    rng = np.random.default_rng(seed)
+    n_columns = int(np.ceil(np.sqrt(n_plots)))
+    rows, columns = np.divmod(np.arange(n_plots), n_columns)
+
+    x0 = columns*(plot_width + gap_width)
+    y0 = rows*(plot_length + gap_length)
+    dx = np.array([0.0, plot_width, plot_width, 0.0])
+    dy = np.array([0.0, 0.0, plot_length, plot_length])
+    corners = np.stack([x0[:, np.newaxis] + dx, y0[:, np.newaxis] + dy], axis=2)
+
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    corners = corners @ rotation.T + np.array([ORIGIN_EAST, ORIGIN_NORTH])
+
+    order = np.argsort(rng.random((n_plots, 4)), axis=1)
+    return np.take_along_axis(corners, order[:, :, np.newaxis], axis=1)
+
+
+def field_boundary(corners, n_points, margin=5.0):
+    # Returns a (n_points,2) array of east and north coordinates on an ellipse enclosing all plot corners
+    east = corners[..., 0].ravel()
+    north = corners[..., 1].ravel()
+    center_east, center_north = (east.min() + east.max())/2.0, (north.min() + north.max())/2.0
+    radius_east = (east.max() - east.min())/np.sqrt(2.0) + margin
+    radius_north = (north.max() - north.min())/np.sqrt(2.0) + margin
+    theta = np.linspace(0.0, 2.0*np.pi, n_points, endpoint=False)
+    return np.stack([center_east + radius_east*np.cos(theta), center_north + radius_north*np.sin(theta)], axis=1)
+
+
+def write_plot_csv(filename, corners, altitude=10.0):
+    ids = np.repeat(['plot_' + str(i) for i in range(corners.shape[0])], 4)
+    with open(filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, delimiter=',', quotechar='"')
+        csvwriter.writerows(zip(corners[..., 1].ravel(), corners[..., 0].ravel(), [altitude]*len(ids), ids))
+
+
+def write_field_csv(filename, boundary, altitude=10.0):
+    with open(filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile, delimiter=',', quotechar='"')
+        csvwriter.writerows(zip(boundary[:, 1], boundary[:, 0], [altitude]*boundary.shape[0]))